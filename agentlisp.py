@@ -4,12 +4,18 @@
 import sys
 import os
 import json
+import math
+import pickle
+import shelve
+import time
+import hashlib
 import argparse
 from pathlib import Path
-from typing import NoReturn, Any, cast
+from typing import Callable, NoReturn, Any, cast
 
 from anthropic import Anthropic
 from anthropic.types import MessageParam, ToolUseBlock, TextBlock, ToolParam
+from lisp_ast import Program
 from parser import parse_program, ParseError
 from eval import (
     State,
@@ -22,6 +28,7 @@ from eval import (
     TellCall,
     AskCall,
     create_initial_state,
+    run_until_syscall,
     step_with_syscall,
 )
 
@@ -43,22 +50,216 @@ RUN_TOOL: ToolParam = {
 }
 
 
+# Parsed programs are cached here, keyed on the hash of their source text
+PROGRAM_CACHE_DIR = Path.home() / ".cache" / "agentlisp"
+
+
+def parser_fingerprint() -> str | None:
+    """
+    Hash the modules defining the AST and the parser.
+
+    Programs are cached under this hash, so changing either module invalidates
+    programs cached by earlier versions.
+
+    Returns:
+        The hash, or None if the modules cannot be read
+    """
+    digest = hashlib.sha256()
+    for definition in (Program, parse_program):
+        module_file = sys.modules[definition.__module__].__file__
+        if module_file is None:
+            return None
+        try:
+            digest.update(Path(module_file).read_bytes())
+        except OSError:
+            return None
+    return digest.hexdigest()
+
+
+PARSER_FINGERPRINT = parser_fingerprint()
+
+
+def load_program(program_text: str, use_cache: bool = True) -> Program:
+    """
+    Parse a program, reusing the result of an earlier parse of the same text.
+
+    Raises:
+        ParseError: If the program text is malformed
+    """
+    if not use_cache or PARSER_FINGERPRINT is None:
+        return parse_program(program_text)
+
+    digest = hashlib.sha256(f"{PARSER_FINGERPRINT}:{program_text}".encode()).hexdigest()
+    cache_file = PROGRAM_CACHE_DIR / f"{digest}.pkl"
+    try:
+        with open(cache_file, "rb") as f:
+            cached = pickle.load(f)
+        if isinstance(cached, Program):
+            return cached
+    except FileNotFoundError:
+        # Not cached yet, the entry is written below
+        pass
+    except Exception:
+        # A corrupt pickle can fail to load in many ways, drop it and parse again
+        try:
+            cache_file.unlink()
+        except OSError:
+            pass
+
+    program = parse_program(program_text)
+    # Write to a temporary file first so a concurrent run never sees a partial pickle
+    temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        PROGRAM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(temp_file, "wb") as f:
+            pickle.dump(program, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, cache_file)
+    except (OSError, RecursionError):
+        # Caching is best effort, and very deeply nested programs cannot be pickled
+        temp_file.unlink(missing_ok=True)
+    return program
+
+
+class LLMCache:
+    """
+    Persists LLM responses keyed on the model and the exact conversation sent.
+
+    A conversation only grows within a session, so responses can only be reused
+    by later runs, and the cache lives in a shelve file rather than in memory.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the cache, creating the shelve file if needed."""
+        self.store: shelve.Shelf[str] = shelve.open(path)
+
+    @staticmethod
+    def make_key(model: str, messages: list[MessageParam]) -> str:
+        """Hash a request into a cache key."""
+        payload = json.dumps({"model": model, "messages": messages}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Look up a cached response."""
+        return self.store.get(key)
+
+    def set(self, key: str, response: str) -> None:
+        """Record a response."""
+        self.store[key] = response
+        self.store.sync()
+
+
+class RateLimiter:
+    """Token buckets that keep LLM requests under per-minute request and token limits."""
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Initialize the limiter with full buckets."""
+        # A bucket smaller than one request would never allow one
+        if not 1 <= rpm < math.inf:
+            raise ValueError(f"Requests per minute must be at least 1, got {rpm}")
+        if not 0 < tpm < math.inf:
+            raise ValueError(f"Tokens per minute must be positive, got {tpm}")
+        self.rpm = rpm
+        self.tpm = tpm
+        self.clock = clock
+        self.sleep = sleep
+        self.requests = rpm
+        self.tokens = tpm
+        self.last_refill = clock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter | None":
+        """
+        Create a limiter configured by AGENTLISP_RPM and AGENTLISP_TPM.
+
+        Requests are only limited when one of the variables is set, and the other
+        then defaults to 40 requests or 16000 tokens per minute.
+
+        Returns:
+            The limiter, or None if neither variable is set
+        """
+        rpm = os.getenv("AGENTLISP_RPM")
+        tpm = os.getenv("AGENTLISP_TPM")
+        if rpm is None and tpm is None:
+            return None
+        try:
+            return cls(float(rpm or "40"), float(tpm or "16000"))
+        except ValueError as e:
+            raise ValueError(f"Invalid AGENTLISP_RPM or AGENTLISP_TPM: {e}")
+
+    @staticmethod
+    def estimate_tokens(messages: list[MessageParam]) -> int:
+        """Roughly estimate the input tokens of messages at four characters per token."""
+        return len(json.dumps(messages)) // 4 if messages else 0
+
+    def refill(self) -> None:
+        """Add the capacity accrued since the last refill."""
+        now = self.clock()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, new_messages: list[MessageParam]) -> None:
+        """
+        Block until a request sending these messages fits within the limits.
+
+        Only messages past the prompt cache boundary are charged, since input
+        read from the cache does not count against the token limit.
+        """
+        # A request larger than a whole minute's budget waits for a full bucket
+        needed = min(self.estimate_tokens(new_messages), self.tpm)
+        while True:
+            self.refill()
+            if self.requests >= 1 and self.tokens >= needed:
+                self.requests -= 1
+                self.tokens -= needed
+                return
+            wait = max(
+                (1 - self.requests) * 60 / self.rpm,
+                (needed - self.tokens) * 60 / self.tpm,
+            )
+            print(f"[Rate limited, waiting {wait:.1f}s]", file=sys.stderr, flush=True)
+            self.sleep(wait)
+
+
 class ChatbotSession:
     """Manages the chatbot session for an AgentLisp program."""
 
-    def __init__(self, program_path: str, api_key: str) -> None:
+    def __init__(
+        self,
+        program_path: str,
+        api_key: str,
+        cache_path: str | None = None,
+        use_program_cache: bool = True,
+    ) -> None:
         """Initialize the chatbot session."""
         self.program_path = program_path
         self.client = Anthropic(api_key=api_key)
         self.conversation: list[MessageParam] = []
+        # Length of the conversation prefix already sent, and so cached by the API
+        self.cache_boundary = 0
         self.model = "claude-sonnet-4-20250514"
+        # Responses are only cached when they can be reused by later runs
+        self.llm_cache = LLMCache(cache_path) if cache_path else None
+
+        try:
+            self.rate_limiter = RateLimiter.from_env()
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
         # Parse the program
         with open(program_path, "r") as f:
             self.program_text = f.read()
 
         try:
-            self.program = parse_program(self.program_text)
+            self.program = load_program(self.program_text, use_program_cache)
         except ParseError as e:
             print(f"Parse error: {e}", file=sys.stderr)
             sys.exit(1)
@@ -67,6 +268,45 @@ class ChatbotSession:
         self.state: State | None = create_initial_state(self.program)
         self.step_count = 0
 
+        # Program output not yet printed, flushed in one write
+        self.output_buffer: list[str] = []
+
+    def wait_for_rate_limit(self) -> None:
+        """Block until the next request fits within the configured rate limits, if any."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self.conversation[self.cache_boundary:])
+
+    def request_messages(self) -> list[MessageParam]:
+        """
+        Prepare the conversation for a request with prompt cache breakpoints.
+
+        The end of the conversation is marked so the API caches it for the next
+        request, which reads it back through the mark left at the cache boundary.
+        """
+        messages = list(self.conversation)
+        marked = {len(messages) - 1, self.cache_boundary - 1}
+        for index in marked:
+            if index < 0:
+                continue
+            message = messages[index]
+            content = message["content"]
+            blocks: list[Any] = (
+                [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+            )
+            if not blocks:
+                continue
+            last_block = cast(dict[str, Any], blocks[-1])
+            blocks[-1] = {**last_block, "cache_control": {"type": "ephemeral"}}
+            messages[index] = cast(MessageParam, {"role": message["role"], "content": blocks})
+        self.cache_boundary = len(messages)
+        return messages
+
+    def flush_output(self) -> None:
+        """Print buffered program output."""
+        if self.output_buffer:
+            print("\n".join(self.output_buffer), flush=True)
+            self.output_buffer.clear()
+
     def get_state_description(self) -> str:
         """Get a human-readable description of the current state."""
         if self.state is None:
@@ -76,13 +316,13 @@ class ChatbotSession:
         elif isinstance(self.state, Interop):
             syscall = self.state.syscall
             if isinstance(syscall, ReadCall):
-                return f"Waiting for user input (will bind to variable '{syscall.var}')"
+                return "Waiting for user input"
             elif isinstance(syscall, WriteCall):
                 return f"Writing to output: {repr(syscall.text)}"
             elif isinstance(syscall, TellCall):
                 return f"Adding to conversation: {repr(syscall.text)}"
             elif isinstance(syscall, AskCall):
-                return f"Asking LLM: {repr(syscall.question)} (will bind to variable '{syscall.var}')"
+                return f"Asking LLM: {repr(syscall.question)}"
             return "Waiting for system call"
         elif isinstance(self.state, Computing):
             return f"Computing (step {self.step_count})"
@@ -91,8 +331,9 @@ class ChatbotSession:
     def handle_syscall_interactively(self, syscall: SysCall) -> str:
         """Handle a system call, potentially prompting the user."""
         if isinstance(syscall, ReadCall):
-            # Read input from user
-            print(f"\n[Program requests input for '{syscall.var}']")
+            # Read input from user, showing any output that leads up to it first
+            self.flush_output()
+            print("\n[Program requests input]")
             try:
                 user_input = input("> ")
                 return user_input
@@ -101,40 +342,54 @@ class ChatbotSession:
 
         elif isinstance(syscall, WriteCall):
             # Write output to stdout
-            print(f"\n[Program output]: {syscall.text}")
+            self.output_buffer.append(f"\n[Program output]: {syscall.text}")
             return ""
 
         elif isinstance(syscall, TellCall):
             # Append to LLM conversation
-            print(f"\n[Program adds to conversation]: {syscall.text}")
+            self.output_buffer.append(f"\n[Program adds to conversation]: {syscall.text}")
             msg: MessageParam = {"role": "user", "content": syscall.text}
             self.conversation.append(msg)
             return ""
 
         elif isinstance(syscall, AskCall):
             # Ask the LLM and get response
+            self.flush_output()
             print(f"\n[Program asks LLM]: {syscall.question}")
             msg_ask: MessageParam = {"role": "user", "content": syscall.question}
             self.conversation.append(msg_ask)
 
-            # Make LLM call without tools (this is a program-initiated call)
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=8192,
-                messages=self.conversation,
-            )
-
-            # Extract text from response
-            response_text = ""
-            for block in response.content:
-                if block.type == "text":
-                    response_text += block.text
+            # Reuse the response if this exact conversation was asked before
+            print("[LLM responds]: ", end="", flush=True)
+            cached: str | None = None
+            if self.llm_cache is not None:
+                cache_key = LLMCache.make_key(self.model, self.conversation)
+                cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                response_text = cached
+                print(response_text)
+            else:
+                # Make LLM call without tools (this is a program-initiated call),
+                # streaming the response so it shows up as soon as it is generated
+                chunks: list[str] = []
+                self.wait_for_rate_limit()
+                with self.client.messages.stream(
+                    model=self.model,
+                    max_tokens=8192,
+                    messages=self.request_messages(),
+                ) as stream:
+                    for text in stream.text_stream:
+                        chunks.append(text)
+                        print(text, end="", flush=True)
+                print()
+                response_text = "".join(chunks)
+                if self.llm_cache is not None:
+                    self.llm_cache.set(cache_key, response_text)
 
             # Add assistant's response to conversation
             msg_response: MessageParam = {"role": "assistant", "content": response_text}
             self.conversation.append(msg_response)
 
-            print(f"[LLM responds]: {response_text}")
             return response_text
 
         return ""
@@ -173,11 +428,18 @@ class ChatbotSession:
                 self.step_count += 1
                 steps_executed += 1
             else:
-                # Regular computation step
-                output_lines.append(f"Step {self.step_count}: Computing...")
-                self.state = step_with_syscall(self.state, None)
-                self.step_count += 1
-                steps_executed += 1
+                # Run computation steps until the program needs a system call
+                first_step = self.step_count
+                max_steps = -1 if steps == -1 else steps - steps_executed
+                self.state, taken = run_until_syscall(self.state, max_steps=max_steps)
+                self.step_count += taken
+                steps_executed += taken
+                if taken > 1:
+                    output_lines.append(f"Steps {first_step}-{self.step_count - 1}: Computing...")
+                else:
+                    output_lines.append(f"Step {first_step}: Computing...")
+
+        self.flush_output()
 
         # Add final state
         if self.state is not None:
@@ -239,10 +501,11 @@ class ChatbotSession:
             self.conversation.append(msg_user)
 
             # Call LLM with tool support
+            self.wait_for_rate_limit()
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=8192,
-                messages=self.conversation,
+                messages=self.request_messages(),
                 tools=[RUN_TOOL],
             )
 
@@ -298,20 +561,28 @@ class ChatbotSession:
                 )
                 self.conversation.append(msg_tool)
 
-                # Get assistant's response after tool execution
-                follow_up = self.client.messages.create(
+                # Get assistant's response after tool execution, printing it as it streams
+                printed_text = False
+                self.wait_for_rate_limit()
+                with self.client.messages.stream(
                     model=self.model,
                     max_tokens=8192,
-                    messages=self.conversation,
+                    messages=self.request_messages(),
                     tools=[RUN_TOOL],
-                )
+                ) as stream:
+                    for text in stream.text_stream:
+                        if not printed_text:
+                            print("\nAssistant: ", end="")
+                            printed_text = True
+                        print(text, end="", flush=True)
+                    follow_up = stream.get_final_message()
+                if printed_text:
+                    print()
 
                 # Process follow-up (could have more tool calls)
                 follow_up_content: list[dict[str, Any]] = []
                 for block in follow_up.content:
                     if isinstance(block, TextBlock):
-                        if block.text:
-                            print(f"\nAssistant: {block.text}")
                         follow_up_content.append({"type": "text", "text": block.text})
 
                 msg_follow_up: MessageParam = cast(
@@ -338,6 +609,18 @@ def main() -> NoReturn:
         type=str,
         help="Path to the .alisp program file to execute"
     )
+    parser.add_argument(
+        "--llm-cache",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Persist responses to program asks in this file and reuse them across runs"
+    )
+    parser.add_argument(
+        "--no-program-cache",
+        action="store_true",
+        help=f"Always parse the program instead of reusing a parse cached in {PROGRAM_CACHE_DIR}"
+    )
 
     args = parser.parse_args()
     program_path = args.program
@@ -354,7 +637,7 @@ def main() -> NoReturn:
         sys.exit(1)
 
     # Create and run session
-    session = ChatbotSession(program_path, api_key)
+    session = ChatbotSession(program_path, api_key, args.llm_cache, not args.no_program_cache)
     session.run()
 
 
@@ -1,7 +1,7 @@
 """Small-step evaluator for the Lisp interpreter."""
 
-from dataclasses import dataclass
-from typing import Union, Callable
+from dataclasses import dataclass, field
+from typing import Any, Union, Callable, Mapping, Sequence
 from lisp_ast import (
     Expr,
     IntLiteral,
@@ -9,6 +9,7 @@ from lisp_ast import (
     FunctionCall,
     IfExpr,
     Variable,
+    VariableRef,
     LetBinding,
     LetExpr,
     WriteExpr,
@@ -17,38 +18,65 @@ from lisp_ast import (
     AskExpr,
     FunctionDef,
     Program,
+    Value,
 )
+from jit import CompiledDefinition, CompiledFunction, compile_function
+from optimize import optimize_program
 
 
-# Value types that expressions can evaluate to
-Value = Union[int, str]
+# Number of calls after which a function is compiled to Python code
+JIT_THRESHOLD = 50
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class Env:
-    """Environment mapping variable names to values."""
-
-    bindings: dict[str, Value]
-    functions: dict[str, FunctionDef]
-
-    def lookup(self, name: str) -> Value:
-        """Look up a variable in the environment."""
-        if name not in self.bindings:
-            raise RuntimeError(f"Undefined variable: {name}")
-        return self.bindings[name]
-
-    def extend(self, name: str, value: Value) -> "Env":
-        """Create a new environment with an additional binding."""
-        new_bindings = self.bindings.copy()
-        new_bindings[name] = value
-        return Env(new_bindings, self.functions)
-
-    def extend_many(self, names: list[str], values: list[Value]) -> "Env":
-        """Create a new environment with multiple bindings."""
-        new_bindings = self.bindings.copy()
-        for name, value in zip(names, values):
-            new_bindings[name] = value
-        return Env(new_bindings, self.functions)
+    """Environment holding variable values on a single mutable stack.
+
+    Variables are resolved to offsets within their function's frame ahead of
+    time, so binding is a push and leaving a scope is a truncation.
+    """
+
+    values: list[Value]
+    functions: Mapping[str, FunctionDef]
+    base: int = 0  # Index in values where the current function frame starts
+    call_counts: dict[str, int] = field(default_factory=dict)
+    # Compiled hot functions; None marks functions that cannot be compiled
+    compiled: dict[str, CompiledFunction | None] = field(default_factory=dict)
+    # Every function compiled so far, including callees of hot functions, so a
+    # callee is compiled once however many hot functions call it
+    definitions: dict[str, CompiledDefinition] = field(default_factory=dict)
+
+    def lookup(self, index: int) -> Value:
+        """Look up a variable by its offset in the current frame."""
+        return self.values[self.base + index]
+
+    def extend(self, value: Value) -> None:
+        """Push a binding for the innermost scope."""
+        self.values.append(value)
+
+    def extend_many(self, values: list[Value]) -> None:
+        """Push multiple bindings for the innermost scope."""
+        self.values.extend(values)
+
+    def restore(self, length: int, base: int) -> None:
+        """Drop bindings pushed since length and return to the frame at base."""
+        del self.values[length:]
+        self.base = base
+
+    def fork(self) -> "Env":
+        """Copy the value stack so it can evolve independently of this one.
+
+        Functions and compiled hot functions only depend on the program, so
+        they stay shared.
+        """
+        return Env(
+            list(self.values),
+            self.functions,
+            self.base,
+            self.call_counts,
+            self.compiled,
+            self.definitions,
+        )
 
     def get_function(self, name: str) -> FunctionDef:
         """Look up a function definition."""
@@ -57,32 +85,31 @@ class Env:
         return self.functions[name]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ReadCall:
-    """System call to read input and bind to a variable."""
+    """System call to read input, which becomes the value of the read expression."""
 
-    var: str
+    pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WriteCall:
     """System call to write output."""
 
     text: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TellCall:
     """System call to append to LLM conversation."""
 
     text: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AskCall:
-    """System call to ask LLM and bind response to a variable."""
+    """System call to ask LLM, whose response becomes the value of the ask expression."""
 
-    var: str
     question: str
 
 
@@ -91,7 +118,7 @@ SysCall = Union[ReadCall, WriteCall, TellCall, AskCall]
 
 
 # Evaluation contexts - represent "holes" in expressions where evaluation is happening
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IfContext:
     """Context for evaluating an if expression's condition."""
 
@@ -99,43 +126,53 @@ class IfContext:
     else_expr: Expr
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LetContext:
     """Context for evaluating a let binding's value."""
 
     var_name: str
-    remaining_bindings: list[LetBinding]
+    bindings: Sequence[LetBinding]
+    index: int  # Position of the binding being evaluated
     body: Expr
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WriteContext:
     """Context for evaluating a write expression's argument."""
 
     pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TellContext:
     """Context for evaluating a tell expression's argument."""
 
     pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AskContext:
     """Context for evaluating an ask expression's argument."""
 
     pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class FunctionCallContext:
     """Context for evaluating function call arguments."""
 
     func_name: str
     evaluated_args: list[Value]  # Arguments evaluated so far
-    remaining_args: list[Expr]  # Arguments still to evaluate
+    args: Sequence[Expr]
+    index: int  # Position of the argument being evaluated
+
+
+@dataclass(frozen=True, slots=True)
+class ScopeContext:
+    """Context for dropping a let's or function's bindings once its body is done."""
+
+    length: int  # Number of values on the stack before the bindings were pushed
+    base: int  # Frame base to return to
 
 
 # Evaluation context variants
@@ -146,19 +183,33 @@ Context = Union[
     TellContext,
     AskContext,
     FunctionCallContext,
+    ScopeContext,
 ]
 
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class Computing:
-    """State representing ongoing computation."""
+    """State representing ongoing computation.
+
+    Stepping updates the state in place rather than building a new one, so the
+    innermost context sits at the end of the stack for O(1) push and pop.
+    """
 
     env: Env
     expr: Expr
-    contexts: list[Context]  # Stack of evaluation contexts
+    contexts: list[Context]  # Stack of evaluation contexts, innermost last
+
+    def fork(self) -> "Computing":
+        """Copy this state so that both copies can be stepped independently.
+
+        Stepping mutates a state, so callers that need to keep a state around
+        while continuing from it must fork it first. Contexts are immutable, so
+        copying the stack itself is enough.
+        """
+        return Computing(self.env.fork(), self.expr, list(self.contexts))
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Interop:
     """State representing a system call waiting to be handled."""
 
@@ -166,7 +217,7 @@ class Interop:
     continuation: "State"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Done:
     """State representing completed computation."""
 
@@ -176,6 +227,9 @@ class Done:
 # State variants
 State = Union[Computing, Interop, Done]
 
+# Shared placeholder expression for system calls that have not produced a result yet
+EMPTY_STRING = StringLiteral("")
+
 
 def expr_to_value(expr: Expr) -> Value | None:
     """Convert an expression to a value if it's a literal."""
@@ -195,180 +249,273 @@ def is_truthy(value: Value) -> bool:
     return False
 
 
-def apply_context(env: Env, ctx: Context, value: Value, contexts: list[Context]) -> State:
-    """Apply a value to an evaluation context, continuing computation."""
-    if isinstance(ctx, IfContext):
-        # Condition evaluated, choose branch
-        if is_truthy(value):
-            return Computing(env, ctx.then_expr, contexts)
-        else:
-            return Computing(env, ctx.else_expr, contexts)
+# Text of small integers, computed once like CPython's own small-int cache
+INT_TEXT_CACHE = {i: str(i) for i in range(-128, 256)}
 
-    if isinstance(ctx, LetContext):
-        # Binding value evaluated, extend environment
-        new_env = env.extend(ctx.var_name, value)
 
-        if len(ctx.remaining_bindings) == 0:
-            # No more bindings, evaluate body
-            return Computing(new_env, ctx.body, contexts)
-        else:
-            # More bindings to process
-            next_binding = ctx.remaining_bindings[0]
-            remaining_bindings_new = ctx.remaining_bindings[1:]
-            let_ctx: Context = LetContext(next_binding.name, remaining_bindings_new, ctx.body)
-            return Computing(new_env, next_binding.value, [let_ctx] + contexts)
-
-    if isinstance(ctx, WriteContext):
-        # Argument evaluated, perform system call
-        continuation = Computing(env, StringLiteral(""), contexts)
-        return Interop(WriteCall(str(value)), continuation)
-
-    if isinstance(ctx, TellContext):
-        # Argument evaluated, perform system call
-        continuation = Computing(env, StringLiteral(""), contexts)
-        return Interop(TellCall(str(value)), continuation)
-
-    if isinstance(ctx, AskContext):
-        # Question evaluated, perform system call
-        temp_var = "__ask_result__"
-        # After syscall, we need to look up the variable and continue
-        continuation = Computing(
-            env.extend(temp_var, ""), Variable(temp_var), contexts
+def as_text(value: Value) -> str:
+    """Convert a value to text for system calls, skipping str() for strings."""
+    if isinstance(value, str):
+        return value
+    text = INT_TEXT_CACHE.get(value)
+    if text is None:
+        text = str(value)
+    return text
+
+
+def push_scope(state: Computing) -> None:
+    """Arrange for bindings pushed from now on to be dropped when the current expression is done.
+
+    If the innermost context already restores an enclosing scope it covers the new
+    bindings too, so lets in tail position do not grow the context stack.
+    """
+    contexts = state.contexts
+    if len(contexts) > 0 and isinstance(contexts[-1], ScopeContext):
+        return
+    env = state.env
+    contexts.append(ScopeContext(len(env.values), env.base))
+
+
+def return_value(state: Computing, value: Value) -> State:
+    """Hand a computed value to the innermost context, or finish if there is none."""
+    if len(state.contexts) == 0:
+        return Done(value)
+    return apply_context(state, state.contexts.pop(), value)
+
+
+def call_function(state: Computing, func_def: FunctionDef, args: list[Value]) -> State:
+    """Enter a function body with a fresh frame holding its arguments."""
+    if len(args) != len(func_def.params):
+        raise RuntimeError(
+            f"Function {func_def.name} expects {len(func_def.params)} "
+            f"arguments, got {len(args)}"
         )
-        return Interop(AskCall(temp_var, str(value)), continuation)
 
-    if isinstance(ctx, FunctionCallContext):
-        # One argument evaluated, check if more to go
-        evaluated = ctx.evaluated_args + [value]
+    env = state.env
+    name = func_def.name
+    compiled = env.compiled.get(name)
+    if compiled is not None:
+        # Hot function, run it to completion in one step
+        return return_value(state, compiled(args))
+
+    if name not in env.compiled:
+        count = env.call_counts.get(name, 0) + 1
+        env.call_counts[name] = count
+        if count >= JIT_THRESHOLD:
+            env.compiled[name] = compile_function(func_def, env.functions, env.definitions)
+
+    contexts = state.contexts
+    if len(contexts) > 0 and isinstance(contexts[-1], ScopeContext):
+        # A call in tail position ends the enclosing scope, and the arguments are
+        # already evaluated, so the caller's frame is dead and can be dropped now
+        del env.values[contexts[-1].length:]
+    else:
+        contexts.append(ScopeContext(len(env.values), env.base))
+    env.base = len(env.values)
+    env.extend_many(args)
+    state.expr = func_def.body
+    return state
+
+
+def apply_scope_context(state: Computing, ctx: ScopeContext, value: Value) -> State:
+    """Body evaluated, drop its bindings and pass the value on."""
+    state.env.restore(ctx.length, ctx.base)
+    return return_value(state, value)
+
+
+def apply_if_context(state: Computing, ctx: IfContext, value: Value) -> State:
+    """Condition evaluated, choose branch."""
+    if is_truthy(value):
+        state.expr = ctx.then_expr
+    else:
+        state.expr = ctx.else_expr
+    return state
+
+
+def apply_let_context(state: Computing, ctx: LetContext, value: Value) -> State:
+    """Binding value evaluated, extend environment."""
+    state.env.extend(value)
+
+    next_index = ctx.index + 1
+    if next_index == len(ctx.bindings):
+        # No more bindings, evaluate body
+        state.expr = ctx.body
+    else:
+        # More bindings to process
+        next_binding = ctx.bindings[next_index]
+        state.contexts.append(LetContext(next_binding.name, ctx.bindings, next_index, ctx.body))
+        state.expr = next_binding.value
+    return state
+
+
+def apply_write_context(state: Computing, ctx: WriteContext, value: Value) -> State:
+    """Argument evaluated, perform system call."""
+    state.expr = EMPTY_STRING
+    return Interop(WriteCall(as_text(value)), state)
+
+
+def apply_tell_context(state: Computing, ctx: TellContext, value: Value) -> State:
+    """Argument evaluated, perform system call."""
+    state.expr = EMPTY_STRING
+    return Interop(TellCall(as_text(value)), state)
+
+
+def apply_ask_context(state: Computing, ctx: AskContext, value: Value) -> State:
+    """Question evaluated, perform system call."""
+    # The response replaces the placeholder once the syscall is handled
+    state.expr = EMPTY_STRING
+    return Interop(AskCall(as_text(value)), state)
+
+
+def apply_function_call_context(
+    state: Computing, ctx: FunctionCallContext, value: Value
+) -> State:
+    """One argument evaluated, call the function if it was the last one."""
+    evaluated = ctx.evaluated_args + [value]
+
+    next_index = ctx.index + 1
+    if next_index == len(ctx.args):
+        # All arguments evaluated, perform call
+        func_def = state.env.get_function(ctx.func_name)
+        return call_function(state, func_def, evaluated)
+    else:
+        # More arguments to evaluate
+        state.contexts.append(FunctionCallContext(ctx.func_name, evaluated, ctx.args, next_index))
+        state.expr = ctx.args[next_index]
+        return state
+
+
+# Handlers applying a value to each context type, dispatched on the exact type
+CONTEXT_HANDLERS: dict[type, Callable[[Computing, Any, Value], State]] = {
+    ScopeContext: apply_scope_context,
+    IfContext: apply_if_context,
+    LetContext: apply_let_context,
+    WriteContext: apply_write_context,
+    TellContext: apply_tell_context,
+    AskContext: apply_ask_context,
+    FunctionCallContext: apply_function_call_context,
+}
+
+
+def apply_context(state: Computing, ctx: Context, value: Value) -> State:
+    """Apply a value to an evaluation context, continuing computation."""
+    handler = CONTEXT_HANDLERS.get(type(ctx))
+    if handler is None:
+        raise RuntimeError(f"Unknown context type: {type(ctx)}")
+    return handler(state, ctx, value)
+
 
-        if len(ctx.remaining_args) == 0:
-            # All arguments evaluated, perform call
-            func_def = env.get_function(ctx.func_name)
+def step_literal(state: Computing, expr: IntLiteral | StringLiteral) -> State:
+    """Expression is a value, pop context and apply it."""
+    return return_value(state, expr.value)
 
-            if len(evaluated) != len(func_def.params):
-                raise RuntimeError(
-                    f"Function {ctx.func_name} expects {len(func_def.params)} "
-                    f"arguments, got {len(evaluated)}"
-                )
 
-            new_env = env.extend_many(func_def.params, evaluated)
-            return Computing(new_env, func_def.body, contexts)
-        else:
-            # More arguments to evaluate
-            next_arg = ctx.remaining_args[0]
-            remaining_args_new = ctx.remaining_args[1:]
-            call_ctx: Context = FunctionCallContext(ctx.func_name, evaluated, remaining_args_new)
-            return Computing(env, next_arg, [call_ctx] + contexts)
+def step_variable_ref(state: Computing, expr: VariableRef) -> State:
+    """Variable reference, resolved to a frame offset."""
+    return return_value(state, state.env.lookup(expr.index))
+
+
+def step_variable(state: Computing, expr: Variable) -> State:
+    """Variables left unresolved are not bound in any enclosing scope."""
+    raise RuntimeError(f"Undefined variable: {expr.name}")
+
+
+def step_if(state: Computing, expr: IfExpr) -> State:
+    """If expression - evaluate condition."""
+    state.contexts.append(IfContext(expr.then_expr, expr.else_expr))
+    state.expr = expr.condition
+    return state
+
+
+def step_let(state: Computing, expr: LetExpr) -> State:
+    """Let expression - evaluate first binding."""
+    if len(expr.bindings) == 0:
+        # No bindings, evaluate body
+        state.expr = expr.body
+        return state
+
+    push_scope(state)
+    first_binding = expr.bindings[0]
+    state.contexts.append(LetContext(first_binding.name, expr.bindings, 0, expr.body))
+    state.expr = first_binding.value
+    return state
 
-    raise RuntimeError(f"Unknown context type: {type(ctx)}")
+
+def step_write(state: Computing, expr: WriteExpr) -> State:
+    """Write primitive - evaluate argument."""
+    state.contexts.append(WriteContext())
+    state.expr = expr.expr
+    return state
+
+
+def step_read(state: Computing, expr: ReadExpr) -> State:
+    """Read primitive - perform system call immediately."""
+    # The input replaces the placeholder once the syscall is handled
+    state.expr = EMPTY_STRING
+    return Interop(ReadCall(), state)
+
+
+def step_tell(state: Computing, expr: TellExpr) -> State:
+    """Tell primitive - evaluate argument."""
+    state.contexts.append(TellContext())
+    state.expr = expr.expr
+    return state
+
+
+def step_ask(state: Computing, expr: AskExpr) -> State:
+    """Ask primitive - evaluate argument."""
+    state.contexts.append(AskContext())
+    state.expr = expr.expr
+    return state
+
+
+def step_function_call(state: Computing, expr: FunctionCall) -> State:
+    """Function call - evaluate arguments left to right."""
+    if len(expr.args) == 0:
+        # No arguments, call immediately
+        func_def = state.env.get_function(expr.func_name)
+        return call_function(state, func_def, [])
+    else:
+        # Evaluate first argument
+        state.contexts.append(FunctionCallContext(expr.func_name, [], expr.args, 0))
+        state.expr = expr.args[0]
+        return state
+
+
+# Handlers taking one step on each expression type, dispatched on the exact type
+EXPR_HANDLERS: dict[type, Callable[[Computing, Any], State]] = {
+    IntLiteral: step_literal,
+    StringLiteral: step_literal,
+    VariableRef: step_variable_ref,
+    Variable: step_variable,
+    IfExpr: step_if,
+    LetExpr: step_let,
+    WriteExpr: step_write,
+    ReadExpr: step_read,
+    TellExpr: step_tell,
+    AskExpr: step_ask,
+    FunctionCall: step_function_call,
+}
 
 
 def step(state: State) -> State | None:
     """
     Perform one step of evaluation.
 
+    A Computing state is advanced in place and returned, or handed off inside
+    the Interop or Done state it steps to.
+
     Returns the next state, or None if no further progress can be made
     without external input (should not happen in well-formed programs).
     """
-    if isinstance(state, Done):
-        # Computation is complete
-        return None
-
-    if isinstance(state, Interop):
-        # Cannot make progress without handling the system call
-        # This should be handled by the caller using step_with_syscall
-        return None
-
     if isinstance(state, Computing):
-        env = state.env
-        expr = state.expr
-        contexts = state.contexts
-
-        # Check if expression is already a value
-        value = expr_to_value(expr)
-        if value is not None:
-            # Expression is a value
-            if len(contexts) == 0:
-                # No contexts, we're done
-                return Done(value)
-            else:
-                # Pop context and apply value
-                ctx = contexts[0]
-                remaining_contexts = contexts[1:]
-                return apply_context(env, ctx, value, remaining_contexts)
-
-        # Expression is not a value, decompose it
-
-        # Variable reference
-        if isinstance(expr, Variable):
-            val = env.lookup(expr.name)
-            if len(contexts) == 0:
-                return Done(val)
-            else:
-                ctx = contexts[0]
-                remaining_contexts = contexts[1:]
-                return apply_context(env, ctx, val, remaining_contexts)
-
-        # If expression - evaluate condition
-        if isinstance(expr, IfExpr):
-            if_ctx: Context = IfContext(expr.then_expr, expr.else_expr)
-            return Computing(env, expr.condition, [if_ctx] + contexts)
-
-        # Let expression - evaluate first binding
-        if isinstance(expr, LetExpr):
-            if len(expr.bindings) == 0:
-                # No bindings, evaluate body
-                return Computing(env, expr.body, contexts)
-
-            first_binding = expr.bindings[0]
-            remaining_bindings = expr.bindings[1:]
-            let_ctx: Context = LetContext(first_binding.name, remaining_bindings, expr.body)
-            return Computing(env, first_binding.value, [let_ctx] + contexts)
-
-        # Write primitive - evaluate argument
-        if isinstance(expr, WriteExpr):
-            write_ctx: Context = WriteContext()
-            return Computing(env, expr.expr, [write_ctx] + contexts)
-
-        # Read primitive - perform system call immediately
-        if isinstance(expr, ReadExpr):
-            temp_var = "__read_result__"
-            continuation = Computing(
-                env.extend(temp_var, ""), Variable(temp_var), contexts
-            )
-            return Interop(ReadCall(temp_var), continuation)
-
-        # Tell primitive - evaluate argument
-        if isinstance(expr, TellExpr):
-            tell_ctx: Context = TellContext()
-            return Computing(env, expr.expr, [tell_ctx] + contexts)
-
-        # Ask primitive - evaluate argument
-        if isinstance(expr, AskExpr):
-            ask_ctx: Context = AskContext()
-            return Computing(env, expr.expr, [ask_ctx] + contexts)
-
-        # Function call - evaluate arguments left to right
-        if isinstance(expr, FunctionCall):
-            if len(expr.args) == 0:
-                # No arguments, call immediately
-                func_def = env.get_function(expr.func_name)
-
-                if len(func_def.params) != 0:
-                    raise RuntimeError(
-                        f"Function {expr.func_name} expects {len(func_def.params)} "
-                        f"arguments, got 0"
-                    )
-
-                new_env = Env(env.bindings, env.functions)
-                return Computing(new_env, func_def.body, contexts)
-            else:
-                # Evaluate first argument
-                first_arg = expr.args[0]
-                remaining_args = expr.args[1:]
-                call_ctx: Context = FunctionCallContext(expr.func_name, [], remaining_args)
-                return Computing(env, first_arg, [call_ctx] + contexts)
+        handler = EXPR_HANDLERS.get(type(state.expr))
+        if handler is None:
+            return None
+        return handler(state, state.expr)
 
+    # Done states are complete, and Interop states cannot make progress
+    # without the caller handling the system call using step_with_syscall
     return None
 
 
@@ -393,23 +540,10 @@ def step_with_syscall(
         # Handle the system call
         result = syscall_handler(state.syscall)
 
-        # Update continuation with result
-        if isinstance(state.syscall, ReadCall):
-            # Read returns the input value - extend environment
-            if isinstance(state.continuation, Computing):
-                new_env = state.continuation.env.extend(state.syscall.var, result)
-                return Computing(
-                    new_env, state.continuation.expr, state.continuation.contexts
-                )
-            return state.continuation
-
-        if isinstance(state.syscall, AskCall):
-            # Ask returns the LLM response - extend environment
+        # Read returns the input value and Ask the LLM response - continue with it
+        if isinstance(state.syscall, (ReadCall, AskCall)):
             if isinstance(state.continuation, Computing):
-                new_env = state.continuation.env.extend(state.syscall.var, result)
-                return Computing(
-                    new_env, state.continuation.expr, state.continuation.contexts
-                )
+                state.continuation.expr = StringLiteral(result)
             return state.continuation
 
         # Write and Tell just continue with empty string result
@@ -419,10 +553,45 @@ def step_with_syscall(
     return step(state)
 
 
+def run_until_syscall(
+    state: State,
+    syscall_handler: Callable[[SysCall], str] | None = None,
+    max_steps: int = -1,
+) -> tuple[State | None, int]:
+    """
+    Step repeatedly until a system call needs handling or evaluation completes.
+
+    Computing states are stepped inline, without going through step for each
+    one. System calls are handled along the way if a handler is given.
+
+    Args:
+        state: The state to start from
+        syscall_handler: Optional function to handle system calls and return results
+        max_steps: Maximum number of steps to take, or -1 for no limit
+
+    Returns:
+        The state reached and the number of steps taken to reach it
+    """
+    steps = 0
+    handlers = EXPR_HANDLERS
+    current: State | None = state
+    while steps != max_steps:
+        if isinstance(current, Computing):
+            handler = handlers.get(type(current.expr))
+            if handler is None:
+                return None, steps
+            current = handler(current, current.expr)
+        elif isinstance(current, Interop) and syscall_handler is not None:
+            current = step_with_syscall(current, syscall_handler)
+        else:
+            break
+        steps += 1
+    return current, steps
+
+
 def create_initial_state(program: Program) -> State:
     """Create the initial evaluation state from a program."""
-    # Build function environment
-    func_map = {func.name: func for func in program.functions}
+    program = optimize_program(program)
 
     # Get main function
     main_func = program.get_main()
@@ -433,5 +602,5 @@ def create_initial_state(program: Program) -> State:
         raise RuntimeError("Main function must take no parameters")
 
     # Create initial environment and computing state with empty context stack
-    env = Env({}, func_map)
+    env = Env([], program.functions_by_name)
     return Computing(env, main_func.body, [])
@@ -0,0 +1,158 @@
+"""Compiles hot functions into Python functions for the evaluator."""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping
+from lisp_ast import (
+    Expr,
+    IntLiteral,
+    StringLiteral,
+    FunctionCall,
+    IfExpr,
+    VariableRef,
+    LetExpr,
+    FunctionDef,
+    Value,
+)
+
+
+# A compiled function takes its argument values and returns its result
+CompiledFunction = Callable[[list[Value]], Value]
+
+# Longest chain of compiled functions calling each other. Each call in the chain
+# takes a Python stack frame, and reusing compiled callees lets chains grow one
+# function at a time, so they are cut off well below the recursion limit.
+MAX_COMPILED_DEPTH = 200
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledDefinition:
+    """A compiled function with the length of the longest call chain it starts."""
+    run: CompiledFunction
+    depth: int
+
+
+class NotCompilable(Exception):
+    """Raised when a function falls outside the compilable subset."""
+    pass
+
+
+def generate_expr(
+    expr: Expr,
+    depth: int,
+    functions: Mapping[str, FunctionDef],
+    compiled: dict[str, CompiledDefinition],
+    active: set[str],
+    callees: dict[str, CompiledDefinition],
+) -> str:
+    """
+    Generate Python source for an expression evaluated with depth values in its frame.
+
+    Frame slot i is held in the local variable v<i>, and the compiled callees the
+    source refers to are added to callees under the names it calls them by.
+    """
+    if isinstance(expr, (IntLiteral, StringLiteral)):
+        return repr(expr.value)
+
+    if isinstance(expr, VariableRef):
+        return f"v{expr.index}"
+
+    if isinstance(expr, IfExpr):
+        condition = generate_expr(expr.condition, depth, functions, compiled, active, callees)
+        then_expr = generate_expr(expr.then_expr, depth, functions, compiled, active, callees)
+        else_expr = generate_expr(expr.else_expr, depth, functions, compiled, active, callees)
+        # Values are truthy exactly when non-zero or non-empty
+        return f"({then_expr} if {condition} else {else_expr})"
+
+    if isinstance(expr, LetExpr):
+        # Slots are assigned before they are read, so a later let may reuse them
+        parts: list[str] = []
+        for i, binding in enumerate(expr.bindings):
+            value = generate_expr(binding.value, depth + i, functions, compiled, active, callees)
+            parts.append(f"(v{depth + i} := {value})")
+        body_depth = depth + len(expr.bindings)
+        parts.append(generate_expr(expr.body, body_depth, functions, compiled, active, callees))
+        return f"({', '.join(parts)},)[-1]"
+
+    if isinstance(expr, FunctionCall):
+        func_def = functions.get(expr.func_name)
+        if func_def is None or len(func_def.params) != len(expr.args):
+            # Leave the error to be reported by the evaluator
+            raise NotCompilable(f"Invalid call to {expr.func_name}")
+        callee = compile_definition(func_def, functions, compiled, active)
+        callee_name = f"f{len(callees)}"
+        callees[callee_name] = callee
+        args = [
+            generate_expr(arg, depth, functions, compiled, active, callees)
+            for arg in expr.args
+        ]
+        return f"{callee_name}([{', '.join(args)}])"
+
+    # System calls need the caller, and unresolved variables are errors
+    raise NotCompilable(f"Cannot compile {type(expr).__name__}")
+
+
+def compile_definition(
+    func_def: FunctionDef,
+    functions: Mapping[str, FunctionDef],
+    compiled: dict[str, CompiledDefinition],
+    active: set[str],
+) -> CompiledDefinition:
+    """Compile a function definition, reusing functions compiled for earlier callees."""
+    if func_def.name in compiled:
+        return compiled[func_def.name]
+    if func_def.name in active:
+        # Recursion may not terminate, keep it interruptible in the evaluator
+        raise NotCompilable(f"Function {func_def.name} is recursive")
+    if len(active) >= MAX_COMPILED_DEPTH:
+        # Functions being compiled all call each other, so the chain is too long already
+        raise NotCompilable(f"Function {func_def.name} is called by too long a call chain")
+
+    active.add(func_def.name)
+    callees: dict[str, CompiledDefinition] = {}
+    arity = len(func_def.params)
+    body = generate_expr(func_def.body, arity, functions, compiled, active, callees)
+    active.remove(func_def.name)
+
+    depth = 1 + max((callee.depth for callee in callees.values()), default=0)
+    if depth > MAX_COMPILED_DEPTH:
+        raise NotCompilable(f"Function {func_def.name} starts too long a call chain")
+
+    lines = ["def run_function(args):"]
+    if arity > 0:
+        params = ", ".join(f"v{i}" for i in range(arity))
+        lines.append(f"    {params}, = args")
+    lines.append(f"    return {body}")
+    try:
+        code = compile("\n".join(lines), f"<alisp {func_def.name}>", "exec")
+    except (SyntaxError, RecursionError, MemoryError):
+        # Very deeply nested bodies exceed the limits of the Python parser
+        raise NotCompilable(f"Function {func_def.name} is too deeply nested")
+    namespace: dict[str, Any] = {name: callee.run for name, callee in callees.items()}
+    exec(code, namespace)
+
+    definition = CompiledDefinition(namespace["run_function"], depth)
+    compiled[func_def.name] = definition
+    return definition
+
+
+def compile_function(
+    func_def: FunctionDef,
+    functions: Mapping[str, FunctionDef],
+    compiled: dict[str, CompiledDefinition],
+) -> CompiledFunction | None:
+    """
+    Compile a function into Python source and load it.
+
+    Only functions that never perform system calls and never recurse qualify,
+    so a compiled call always completes without needing to yield to the caller.
+    Functions already in compiled are reused, and the function and the callees
+    compiled along with it are added to it.
+
+    Returns:
+        The compiled function, or None if the function cannot be compiled
+    """
+    try:
+        return compile_definition(func_def, functions, compiled, set()).run
+    except (NotCompilable, RecursionError):
+        # Bodies nested too deeply to generate source for stay interpreted
+        return None
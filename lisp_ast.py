@@ -1,29 +1,34 @@
 """Typed AST definitions for the Lisp interpreter."""
 
-from dataclasses import dataclass
-from typing import Union
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping, Sequence, Union
 
 
-@dataclass(frozen=True)
+# Value types that expressions can evaluate to
+Value = Union[int, str]
+
+
+@dataclass(frozen=True, slots=True)
 class IntLiteral:
     """Integer literal expression."""
     value: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class StringLiteral:
     """String literal expression."""
     value: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class FunctionCall:
     """Function call expression."""
     func_name: str
-    args: list["Expr"]
+    args: Sequence["Expr"]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IfExpr:
     """If conditional expression."""
     condition: "Expr"
@@ -31,45 +36,52 @@ class IfExpr:
     else_expr: "Expr"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Variable:
     """Variable reference expression."""
     name: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
+class VariableRef:
+    """Variable reference resolved to an offset in the enclosing function's frame."""
+    index: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
 class LetBinding:
     """A single variable binding in a let expression."""
     name: str
     value: "Expr"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LetExpr:
     """Let expression with local variable bindings."""
-    bindings: list[LetBinding]
+    bindings: Sequence[LetBinding]
     body: "Expr"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WriteExpr:
     """Write primitive form - writes text to output."""
     expr: "Expr"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ReadExpr:
     """Read primitive form - reads text from input."""
     pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TellExpr:
     """Tell primitive form - appends prompt to LLM conversation."""
     expr: "Expr"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AskExpr:
     """Ask primitive form - poses question to LLM."""
     expr: "Expr"
@@ -82,6 +94,7 @@ Expr = Union[
     FunctionCall,
     IfExpr,
     Variable,
+    VariableRef,
     LetExpr,
     WriteExpr,
     ReadExpr,
@@ -90,22 +103,91 @@ Expr = Union[
 ]
 
 
-@dataclass(frozen=True)
+def resolve_variables(
+    expr: Expr, scope: list[str], refs: dict[tuple[int, str], VariableRef]
+) -> Expr:
+    """Rewrite variable references bound in scope into frame offsets.
+
+    The scope lists visible names in the order their values are pushed onto the
+    frame. Unbound variables are left as-is so that they fail when evaluated.
+    References to the same slot share one node, kept in refs.
+    """
+    if isinstance(expr, Variable):
+        for index in range(len(scope) - 1, -1, -1):
+            if scope[index] == expr.name:
+                key = (index, expr.name)
+                ref = refs.get(key)
+                if ref is None:
+                    ref = refs[key] = VariableRef(index, expr.name)
+                return ref
+        return expr
+
+    if isinstance(expr, FunctionCall):
+        args = tuple(resolve_variables(arg, scope, refs) for arg in expr.args)
+        return FunctionCall(expr.func_name, args)
+
+    if isinstance(expr, IfExpr):
+        return IfExpr(
+            resolve_variables(expr.condition, scope, refs),
+            resolve_variables(expr.then_expr, scope, refs),
+            resolve_variables(expr.else_expr, scope, refs),
+        )
+
+    if isinstance(expr, LetExpr):
+        # Bindings are sequential: each value sees the bindings before it
+        depth = len(scope)
+        bindings: list[LetBinding] = []
+        for binding in expr.bindings:
+            value = resolve_variables(binding.value, scope, refs)
+            bindings.append(LetBinding(binding.name, value))
+            scope.append(binding.name)
+        body = resolve_variables(expr.body, scope, refs)
+        del scope[depth:]
+        return LetExpr(tuple(bindings), body)
+
+    if isinstance(expr, WriteExpr):
+        return WriteExpr(resolve_variables(expr.expr, scope, refs))
+
+    if isinstance(expr, TellExpr):
+        return TellExpr(resolve_variables(expr.expr, scope, refs))
+
+    if isinstance(expr, AskExpr):
+        return AskExpr(resolve_variables(expr.expr, scope, refs))
+
+    return expr
+
+
+@dataclass(frozen=True, slots=True)
 class FunctionDef:
     """Function definition with name, parameters, and body."""
     name: str
-    params: list[str]
+    params: Sequence[str]
     body: Expr
 
+    def __post_init__(self) -> None:
+        # Resolve variables once per function so evaluation never looks up names
+        body = resolve_variables(self.body, list(self.params), {})
+        object.__setattr__(self, "body", body)
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Program:
     """Top-level program containing function definitions."""
-    functions: list[FunctionDef]
+    functions: Sequence[FunctionDef]
+    functions_by_name: Mapping[str, FunctionDef] = field(init=False, repr=False, compare=False)
+    # Optimized form of the program, filled in the first time it is optimized
+    optimized: "Program | None" = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Index functions once so lookups never scan the list, read-only since
+        # every evaluation of the program shares it
+        index = {f.name: f for f in self.functions}
+        object.__setattr__(self, "functions_by_name", MappingProxyType(index))
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # The read-only index cannot be pickled, rebuild it on load instead
+        return (Program, (self.functions,))
 
     def get_main(self) -> FunctionDef | None:
         """Get the main function if it exists."""
-        for func in self.functions:
-            if func.name == "main":
-                return func
-        return None
+        return self.functions_by_name.get("main")
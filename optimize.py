@@ -0,0 +1,327 @@
+"""Optimization pass reducing the number of steps a program takes."""
+
+from typing import Callable, Mapping, Sequence
+from lisp_ast import (
+    Expr,
+    IntLiteral,
+    StringLiteral,
+    FunctionCall,
+    IfExpr,
+    Variable,
+    VariableRef,
+    LetBinding,
+    LetExpr,
+    WriteExpr,
+    TellExpr,
+    AskExpr,
+    FunctionDef,
+    Program,
+)
+
+
+# Largest optimized body, in nodes, that is copied into a caller. Bounding it keeps
+# each inlining step cheap, so long chains of single-use functions optimize in
+# linear time.
+INLINE_SIZE_LIMIT = 64
+
+
+def children(expr: Expr) -> list[Expr]:
+    """List the direct subexpressions of an expression."""
+    if isinstance(expr, FunctionCall):
+        return list(expr.args)
+    if isinstance(expr, IfExpr):
+        return [expr.condition, expr.then_expr, expr.else_expr]
+    if isinstance(expr, LetExpr):
+        return [b.value for b in expr.bindings] + [expr.body]
+    if isinstance(expr, (WriteExpr, TellExpr, AskExpr)):
+        return [expr.expr]
+    return []
+
+
+def with_children(expr: Expr, new_children: Sequence[Expr]) -> Expr:
+    """Rebuild an expression with its direct subexpressions replaced, in children order."""
+    if isinstance(expr, FunctionCall):
+        return FunctionCall(expr.func_name, tuple(new_children))
+    if isinstance(expr, IfExpr):
+        return IfExpr(new_children[0], new_children[1], new_children[2])
+    if isinstance(expr, LetExpr):
+        bindings = tuple(
+            LetBinding(b.name, value) for b, value in zip(expr.bindings, new_children)
+        )
+        return LetExpr(bindings, new_children[-1])
+    if isinstance(expr, WriteExpr):
+        return WriteExpr(new_children[0])
+    if isinstance(expr, TellExpr):
+        return TellExpr(new_children[0])
+    if isinstance(expr, AskExpr):
+        return AskExpr(new_children[0])
+    return expr
+
+
+def map_children(expr: Expr, fn: Callable[[Expr], Expr]) -> Expr:
+    """Apply fn to each direct subexpression, reusing the expression if none change."""
+    old_children = children(expr)
+    new_children = [fn(child) for child in old_children]
+    if all(new is old for new, old in zip(new_children, old_children)):
+        return expr
+    return with_children(expr, new_children)
+
+
+def expr_size(expr: Expr, limit: int) -> int:
+    """Count the nodes of an expression, stopping once the count exceeds limit."""
+    size = 0
+    pending = [expr]
+    while pending and size <= limit:
+        size += 1
+        pending.extend(children(pending.pop()))
+    return size
+
+
+def has_unbound_variables(expr: Expr) -> bool:
+    """Check whether an expression refers to variables that are not in scope."""
+    pending = [expr]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, Variable):
+            return True
+        pending.extend(children(current))
+    return False
+
+
+def calls_in(expr: Expr) -> list[str]:
+    """List the names of all functions called within an expression."""
+    names: list[str] = []
+    pending = [expr]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, FunctionCall):
+            names.append(current.func_name)
+        pending.extend(children(current))
+    return names
+
+
+def strongly_connected_components(graph: Mapping[str, list[str]]) -> list[list[str]]:
+    """
+    Group the functions of a call graph into strongly connected components.
+
+    Components are listed callees first: each one comes after every component
+    its functions call into. Calls to names outside the graph are ignored.
+    """
+    index: dict[str, int] = {}
+    lowlink: dict[str, int] = {}
+    on_stack: set[str] = set()
+    stack: list[str] = []
+    components: list[list[str]] = []
+
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        # Functions being visited, each with its callees still to look at
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, callees = work[-1]
+            for callee in callees:
+                if callee not in graph:
+                    continue
+                if callee not in index:
+                    index[callee] = lowlink[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(graph[callee])))
+                    break
+                if callee in on_stack:
+                    lowlink[node] = min(lowlink[node], index[callee])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component: list[str] = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def shift(expr: Expr, cutoff: int, amount: int) -> Expr:
+    """Move references to frame offsets at or above cutoff by amount."""
+    if amount == 0:
+        return expr
+    if isinstance(expr, VariableRef):
+        if expr.index >= cutoff:
+            return VariableRef(expr.index + amount, expr.name)
+        return expr
+    return map_children(expr, lambda child: shift(child, cutoff, amount))
+
+
+def relocate(expr: Expr, start: int, replacements: Sequence[Expr], removed: int) -> Expr:
+    """Replace references to the slots from start on after some bindings are dropped.
+
+    The slot start + i becomes replacements[i], and slots past the replaced ones
+    move down by the number of slots removed.
+    """
+    if isinstance(expr, VariableRef):
+        offset = expr.index - start
+        if offset < 0:
+            return expr
+        if offset < len(replacements):
+            return replacements[offset]
+        return VariableRef(expr.index - removed, expr.name)
+    return map_children(expr, lambda child: relocate(child, start, replacements, removed))
+
+
+def propagate_bindings(expr: LetExpr, depth: int) -> Expr:
+    """Substitute let bindings of literals and other variables into their uses.
+
+    What remains is merged with a let that makes up the whole body, if any.
+    """
+    bindings: list[LetBinding] = []
+    # What each binding's slot is replaced with: the substituted value, or a
+    # reference to the slot the binding moves to once earlier ones are dropped
+    replacements: list[Expr] = []
+    for binding in expr.bindings:
+        value = binding.value
+        removed = len(replacements) - len(bindings)
+        if removed > 0:
+            value = relocate(value, depth, replacements, removed)
+        # A variable can only refer to slots below the binding, which stay in place
+        if isinstance(value, (IntLiteral, StringLiteral, VariableRef)):
+            replacements.append(value)
+        else:
+            replacements.append(VariableRef(depth + len(bindings), binding.name))
+            bindings.append(binding if value is binding.value else LetBinding(binding.name, value))
+
+    removed = len(replacements) - len(bindings)
+    body = expr.body
+    if removed > 0:
+        body = relocate(body, depth, replacements, removed)
+
+    if len(bindings) == 0:
+        return body
+    if isinstance(body, LetExpr):
+        # Bindings are sequential, so a let directly in the body extends this one
+        return LetExpr((*bindings, *body.bindings), body.body)
+    if removed == 0:
+        return expr
+    return LetExpr(tuple(bindings), body)
+
+
+class Optimizer:
+    """Inlines single-use functions and propagates trivial let bindings."""
+
+    def __init__(self, program: Program) -> None:
+        self.functions = program.functions_by_name
+        callees = {name: calls_in(func.body) for name, func in self.functions.items()}
+        self.call_sites: dict[str, int] = {}
+        for names in callees.values():
+            for name in names:
+                self.call_sites[name] = self.call_sites.get(name, 0) + 1
+
+        # Optimizing callees first means an inlined body is always ready, and a
+        # function can end up calling itself exactly when its component is a cycle
+        self.order: list[str] = []
+        self.recursive: set[str] = set()
+        for component in strongly_connected_components(callees):
+            self.order.extend(component)
+            if len(component) > 1 or component[0] in callees[component[0]]:
+                self.recursive.update(component)
+        self.optimized: dict[str, Expr] = {}
+
+    def optimized_body(self, func: FunctionDef) -> Expr:
+        """Get the optimized body of a function."""
+        if func.name not in self.optimized:
+            self.optimized[func.name] = self.optimize_expr(func.body, len(func.params))
+        return self.optimized[func.name]
+
+    def can_inline(self, call: FunctionCall) -> bool:
+        """Check whether a call can be replaced with the body of its function."""
+        func = self.functions.get(call.func_name)
+        if func is None or len(func.params) != len(call.args):
+            # Leave the error to be reported by the evaluator
+            return False
+        if self.call_sites.get(call.func_name, 0) > 1 or func.name == "main":
+            return False
+        if func.name in self.recursive:
+            return False
+        body = self.optimized_body(func)
+        if expr_size(body, INLINE_SIZE_LIMIT) > INLINE_SIZE_LIMIT:
+            return False
+        # Unbound variables must not be moved where a binding could capture them
+        return not (has_unbound_variables(body) or any(map(has_unbound_variables, call.args)))
+
+    def optimize_expr(self, expr: Expr, depth: int) -> Expr:
+        """Optimize an expression evaluated with depth values in its frame."""
+        if isinstance(expr, LetExpr):
+            bindings: list[LetBinding] = []
+            for i, binding in enumerate(expr.bindings):
+                value = self.optimize_expr(binding.value, depth + i)
+                bindings.append(LetBinding(binding.name, value))
+            body = self.optimize_expr(expr.body, depth + len(bindings))
+            unchanged = body is expr.body and all(
+                new.value is old.value for new, old in zip(bindings, expr.bindings)
+            )
+            let_expr = expr if unchanged else LetExpr(tuple(bindings), body)
+            return propagate_bindings(let_expr, depth)
+
+        if isinstance(expr, FunctionCall):
+            call = map_children(expr, lambda arg: self.optimize_expr(arg, depth))
+            assert isinstance(call, FunctionCall)
+            if not self.can_inline(call):
+                return call
+
+            # Bind the arguments in place of the function's frame, moving the body's
+            # references past the caller's values and each argument's past earlier ones
+            func = self.functions[call.func_name]
+            inlined_body = shift(self.optimized_body(func), 0, depth)
+            if len(call.args) == 0:
+                return inlined_body
+            inlined_bindings = tuple(
+                LetBinding(param, shift(arg, depth, i))
+                for i, (param, arg) in enumerate(zip(func.params, call.args))
+            )
+            return propagate_bindings(LetExpr(inlined_bindings, inlined_body), depth)
+
+        return map_children(expr, lambda child: self.optimize_expr(child, depth))
+
+
+def optimize_program(program: Program) -> Program:
+    """
+    Optimize a program so that it evaluates in fewer steps.
+
+    Small non-recursive functions called from a single place are inlined into
+    their caller, let bindings of literals or other variables are substituted
+    into their uses, and directly nested lets are merged. All three work on
+    resolved variable references, so no renaming is needed.
+
+    The result is remembered on the program, so each program is optimized once.
+    """
+    if program.optimized is not None:
+        return program.optimized
+
+    try:
+        optimizer = Optimizer(program)
+        for name in optimizer.order:
+            optimizer.optimized_body(optimizer.functions[name])
+        functions: list[FunctionDef] = []
+        for func in program.functions:
+            body = optimizer.optimized_body(func)
+            # Unchanged definitions are kept, avoiding resolving their bodies again
+            if body is not func.body:
+                func = FunctionDef(func.name, func.params, body)
+            functions.append(func)
+        optimized = Program(tuple(functions))
+    except RecursionError:
+        # Bodies nested too deeply to walk are evaluated as written
+        optimized = program
+
+    object.__setattr__(optimized, "optimized", optimized)
+    object.__setattr__(program, "optimized", optimized)
+    return optimized
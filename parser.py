@@ -1,6 +1,10 @@
 """Parser for the Lisp-like language."""
 
-from typing import Any
+import functools
+import re
+import sys
+from itertools import islice
+from typing import Any, Callable
 from lisp_ast import (
     Expr,
     IntLiteral,
@@ -24,190 +28,195 @@ class ParseError(Exception):
     pass
 
 
+# Literals are immutable, so identical literals share one instance. Small integers
+# are common enough to preallocate; larger ones are not kept around, and only the
+# most recently used strings are.
+_SMALL_INTS = {i: IntLiteral(i) for i in range(-128, 257)}
+
+
+def int_literal(value: int) -> IntLiteral:
+    """Get the node for an integer literal, shared for small integers."""
+    literal = _SMALL_INTS.get(value)
+    if literal is None:
+        return IntLiteral(value)
+    return literal
+
+
+@functools.lru_cache(maxsize=4096)
+def string_literal(value: str) -> StringLiteral:
+    """Get the shared node for a string literal."""
+    return StringLiteral(value)
+
+
+# Skips whitespace, then captures a parenthesis, a string literal with its escapes, an
+# unterminated string's opening quote, an atom, or nothing at the end of the input;
+# together these match every character of the input. String contents are matched as
+# runs between escapes rather than one character at a time.
+_TOKEN_RE = re.compile(
+    r'[ \t\n\r]*(\(|\)|"[^"\\]*(?:\\.[^"\\]*)*"|"|[^ \t\n\r()"][^ \t\n\r()]*|$)',
+    re.DOTALL,
+)
+
+# Escape sequences in string literals, replaced in a single left-to-right pass
+_ESCAPE_RE = re.compile(r'\\[nt\\"]')
+_ESCAPES = {"\\n": "\n", "\\t": "\t", "\\\\": "\\", '\\"': '"'}
+
+
 class Tokenizer:
     """Tokenizes input text into s-expressions."""
 
     def __init__(self, text: str) -> None:
         self.text = text
-        self.pos = 0
-
-    def peek(self) -> str | None:
-        """Peek at current character without consuming it."""
-        if self.pos >= len(self.text):
-            return None
-        return self.text[self.pos]
-
-    def advance(self) -> str | None:
-        """Consume and return current character."""
-        if self.pos >= len(self.text):
-            return None
-        char = self.text[self.pos]
-        self.pos += 1
-        return char
-
-    def skip_whitespace(self) -> None:
-        """Skip whitespace and comments."""
-        char = self.peek()
-        while char is not None and char in " \t\n\r":
-            self.advance()
-            char = self.peek()
-
-    def read_string(self) -> str:
-        """Read a string literal."""
-        self.advance()  # Skip opening quote
-        chars: list[str] = ['"']  # Start with opening quote
-        while True:
-            char = self.peek()
-            if char is None:
+        # Only the empty matches at the end of the input are falsy
+        self.tokens: list[str] = list(filter(None, _TOKEN_RE.findall(text)))
+
+    def tokenize_all(self) -> list[Any]:
+        """Tokenize into a list of top-level s-expressions, nested lists for each list."""
+        sexps: list[Any] = []
+        # Lists enclosing the one being filled, outermost first
+        stack: list[list[Any]] = []
+        items = sexps
+        for token in self.tokens:
+            if token == "(":
+                new_items: list[Any] = []
+                items.append(new_items)
+                stack.append(items)
+                items = new_items
+            elif token == ")":
+                if len(stack) == 0:
+                    raise ParseError("Unexpected closing parenthesis")
+                items = stack.pop()
+            elif token == '"':
                 raise ParseError("Unterminated string literal")
-            if char == '"':
-                self.advance()
-                chars.append('"')  # Add closing quote
-                break
-            if char == "\\":
-                self.advance()
-                next_char = self.advance()
-                # Store escape sequences as-is so parser can handle them
-                chars.append("\\")
-                if next_char is not None:
-                    chars.append(next_char)
+            elif token[0] == '"':
+                # Strings keep their quotes and escape sequences for the parser to handle
+                items.append(token)
             else:
-                chars.append(char)
-                self.advance()
-        return "".join(chars)
-
-    def read_atom(self) -> str:
-        """Read an atom (identifier or number)."""
-        chars: list[str] = []
-        while True:
-            char = self.peek()
-            if char is None or char in " \t\n\r()":
-                break
-            chars.append(char)
-            self.advance()
-        return "".join(chars)
-
-    def tokenize(self) -> Any:
-        """Tokenize into nested lists representing s-expressions."""
-        self.skip_whitespace()
-        char = self.peek()
-
-        if char is None:
-            return None
-
-        if char == "(":
-            self.advance()
-            items: list[Any] = []
-            while True:
-                self.skip_whitespace()
-                if self.peek() == ")":
-                    self.advance()
-                    break
-                if self.peek() is None:
-                    raise ParseError("Unterminated list")
-                item = self.tokenize()
-                if item is not None:
-                    items.append(item)
-            return items
-
-        if char == ")":
-            raise ParseError("Unexpected closing parenthesis")
-
-        if char == '"':
-            return self.read_string()
-
-        return self.read_atom()
+                # Atoms name functions, parameters and variables, intern them so
+                # comparing and hashing them is cheap and repeated names share storage
+                items.append(sys.intern(token))
+
+        if len(stack) > 0:
+            raise ParseError("Unterminated list")
+        return sexps
+
+
+def parse_if(sexp: list[Any]) -> Expr:
+    """Parse an if special form."""
+    if len(sexp) != 4:
+        raise ParseError("if requires 3 arguments: condition, then, else")
+    condition = parse_expr(sexp[1])
+    then_expr = parse_expr(sexp[2])
+    else_expr = parse_expr(sexp[3])
+    return IfExpr(condition, then_expr, else_expr)
+
+
+def parse_let(sexp: list[Any]) -> Expr:
+    """Parse a let special form."""
+    if len(sexp) != 3:
+        raise ParseError("let requires 2 arguments: bindings and body")
+
+    bindings_sexp = sexp[1]
+    if not isinstance(bindings_sexp, list):
+        raise ParseError("let bindings must be a list")
+
+    bindings: list[LetBinding] = []
+    for binding in bindings_sexp:
+        if not isinstance(binding, list) or len(binding) != 2:
+            raise ParseError("Each let binding must be a list of (name value)")
+
+        name = binding[0]
+        if not isinstance(name, str):
+            raise ParseError("Binding name must be an identifier")
+
+        value = parse_expr(binding[1])
+        bindings.append(LetBinding(name, value))
+
+    body = parse_expr(sexp[2])
+    return LetExpr(tuple(bindings), body)
+
+
+def parse_write(sexp: list[Any]) -> Expr:
+    """Parse a write primitive form."""
+    if len(sexp) != 2:
+        raise ParseError("write requires 1 argument: expression to write")
+    return WriteExpr(parse_expr(sexp[1]))
+
+
+def parse_read(sexp: list[Any]) -> Expr:
+    """Parse a read primitive form."""
+    if len(sexp) != 1:
+        raise ParseError("read takes no arguments")
+    return ReadExpr()
+
+
+def parse_tell(sexp: list[Any]) -> Expr:
+    """Parse a tell primitive form."""
+    if len(sexp) != 2:
+        raise ParseError("tell requires 1 argument: expression to tell")
+    return TellExpr(parse_expr(sexp[1]))
+
+
+def parse_ask(sexp: list[Any]) -> Expr:
+    """Parse an ask primitive form."""
+    if len(sexp) != 2:
+        raise ParseError("ask requires 1 argument: question expression")
+    return AskExpr(parse_expr(sexp[1]))
+
+
+# Parsers for the special and primitive forms, dispatched on the head of the list
+SPECIAL_FORMS: dict[str, Callable[[list[Any]], Expr]] = {
+    "if": parse_if,
+    "let": parse_let,
+    "write": parse_write,
+    "read": parse_read,
+    "tell": parse_tell,
+    "ask": parse_ask,
+}
 
 
 def parse_expr(sexp: Any) -> Expr:
     """Parse an s-expression into an Expr."""
-    # String literal (already parsed by tokenizer)
-    if isinstance(sexp, str) and sexp.startswith('"'):
-        # Process escape sequences
-        content = sexp[1:-1]  # Strip quotes
-        content = content.replace("\\n", "\n")
-        content = content.replace("\\t", "\t")
-        content = content.replace("\\\\", "\\")
-        content = content.replace('\\"', '"')
-        return StringLiteral(content)
-
-    # Integer literal or variable
-    if isinstance(sexp, str):
-        try:
-            return IntLiteral(int(sexp))
-        except ValueError:
-            # Not a number, treat as a variable reference
-            return Variable(sexp)
+    # The tokenizer only produces exact strs and lists, so compare types directly
+    sexp_type = type(sexp)
+
+    if sexp_type is str:
+        first = sexp[0]
+
+        # String literal (already parsed by tokenizer)
+        if first == '"':
+            # Process escape sequences
+            content = sexp[1:-1]  # Strip quotes
+            if "\\" in content:
+                content = _ESCAPE_RE.sub(lambda m: _ESCAPES[m[0]], content)
+            return string_literal(content)
+
+        # Integer literal or variable; only atoms starting like a number can be one,
+        # so most identifiers skip int(). int() also skips whitespace the tokenizer
+        # keeps in atoms, such as form feeds.
+        if first.isdigit() or first == "-" or first == "+" or first.isspace():
+            try:
+                return int_literal(int(sexp))
+            except ValueError:
+                pass
+        # Not a number, treat as a variable reference
+        return Variable(sexp)
 
     # List form
-    if isinstance(sexp, list):
+    if sexp_type is list:
         if len(sexp) == 0:
             raise ParseError("Empty list is not a valid expression")
 
         head = sexp[0]
-        if not isinstance(head, str):
+        if type(head) is not str:
             raise ParseError("Function name must be an identifier")
 
-        # Special form: if
-        if head == "if":
-            if len(sexp) != 4:
-                raise ParseError("if requires 3 arguments: condition, then, else")
-            condition = parse_expr(sexp[1])
-            then_expr = parse_expr(sexp[2])
-            else_expr = parse_expr(sexp[3])
-            return IfExpr(condition, then_expr, else_expr)
-
-        # Special form: let
-        if head == "let":
-            if len(sexp) != 3:
-                raise ParseError("let requires 2 arguments: bindings and body")
-
-            bindings_sexp = sexp[1]
-            if not isinstance(bindings_sexp, list):
-                raise ParseError("let bindings must be a list")
-
-            bindings: list[LetBinding] = []
-            for binding in bindings_sexp:
-                if not isinstance(binding, list) or len(binding) != 2:
-                    raise ParseError("Each let binding must be a list of (name value)")
-
-                name = binding[0]
-                if not isinstance(name, str):
-                    raise ParseError("Binding name must be an identifier")
-
-                value = parse_expr(binding[1])
-                bindings.append(LetBinding(name, value))
-
-            body = parse_expr(sexp[2])
-            return LetExpr(bindings, body)
-
-        # Primitive form: write
-        if head == "write":
-            if len(sexp) != 2:
-                raise ParseError("write requires 1 argument: expression to write")
-            return WriteExpr(parse_expr(sexp[1]))
-
-        # Primitive form: read
-        if head == "read":
-            if len(sexp) != 1:
-                raise ParseError("read takes no arguments")
-            return ReadExpr()
-
-        # Primitive form: tell
-        if head == "tell":
-            if len(sexp) != 2:
-                raise ParseError("tell requires 1 argument: expression to tell")
-            return TellExpr(parse_expr(sexp[1]))
-
-        # Primitive form: ask
-        if head == "ask":
-            if len(sexp) != 2:
-                raise ParseError("ask requires 1 argument: question expression")
-            return AskExpr(parse_expr(sexp[1]))
+        special_form = SPECIAL_FORMS.get(head)
+        if special_form is not None:
+            return special_form(sexp)
 
         # Function call
-        args = [parse_expr(arg) for arg in sexp[1:]]
-        return FunctionCall(head, args)
+        return FunctionCall(head, tuple(map(parse_expr, islice(sexp, 1, None))))
 
     raise ParseError(f"Invalid expression: {sexp}")
 
@@ -239,22 +248,25 @@ def parse_function_def(sexp: Any) -> FunctionDef:
 
     body = parse_expr(sexp[3])
 
-    return FunctionDef(name, params, body)
+    return FunctionDef(name, tuple(params), body)
 
 
+@functools.lru_cache(maxsize=64)
 def parse_program(text: str) -> Program:
-    """Parse a complete program from text."""
-    tokenizer = Tokenizer(text)
-    functions: list[FunctionDef] = []
+    """
+    Parse a complete program from text.
 
-    while True:
-        sexp = tokenizer.tokenize()
-        if sexp is None:
-            break
-        func_def = parse_function_def(sexp)
-        functions.append(func_def)
+    Programs are never modified once parsed, so parsing the same text again
+    returns the earlier result.
+    """
+    functions: list[FunctionDef] = []
+    try:
+        for sexp in Tokenizer(text).tokenize_all():
+            functions.append(parse_function_def(sexp))
+    except RecursionError:
+        raise ParseError("Expression is nested too deeply")
 
     if len(functions) == 0:
         raise ParseError("Program must contain at least one function")
 
-    return Program(functions)
+    return Program(tuple(functions))
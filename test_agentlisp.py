@@ -0,0 +1,190 @@
+"""Tests for the AgentLisp chatbot entry point."""
+
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import mock
+
+from anthropic.types import MessageParam
+
+from agentlisp import LLMCache, RateLimiter, load_program
+
+
+class FakeClock:
+    """A clock that only advances while sleeping."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def message(chars: int) -> MessageParam:
+    """Create a user message of roughly the given serialized size."""
+    return {"role": "user", "content": "x" * chars}
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the token buckets limiting LLM requests."""
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+
+    def limiter(self, rpm: float, tpm: float) -> RateLimiter:
+        return RateLimiter(rpm, tpm, clock=self.clock.time, sleep=self.clock.sleep)
+
+    def acquire(self, limiter: RateLimiter, messages: list[MessageParam]) -> str:
+        """Acquire capacity for a request, returning the notices printed while waiting."""
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            limiter.acquire(messages)
+        return stderr.getvalue()
+
+    def test_requests_within_limits_do_not_wait(self) -> None:
+        """Test that requests fitting in full buckets go through immediately."""
+        limiter = self.limiter(rpm=3, tpm=1000)
+
+        for _ in range(3):
+            self.assertEqual(self.acquire(limiter, [message(400)]), "")
+
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_waits_for_request_capacity(self) -> None:
+        """Test that a request over the request limit waits for one to refill."""
+        limiter = self.limiter(rpm=2, tpm=1000)
+        self.acquire(limiter, [])
+        self.acquire(limiter, [])
+
+        notice = self.acquire(limiter, [])
+
+        self.assertEqual(self.clock.sleeps, [30.0])
+        self.assertIn("waiting 30.0s", notice)
+
+    def test_waits_for_token_capacity(self) -> None:
+        """Test that a request over the token limit waits for enough tokens to refill."""
+        limiter = self.limiter(rpm=60, tpm=600)
+        self.acquire(limiter, [message(2000)])
+        needed = RateLimiter.estimate_tokens([message(2000)])
+
+        self.acquire(limiter, [message(2000)])
+
+        self.assertEqual(len(self.clock.sleeps), 1)
+        self.assertAlmostEqual(self.clock.sleeps[0], (2 * needed - 600) * 60 / 600)
+
+    def test_oversized_request_waits_for_full_bucket(self) -> None:
+        """Test that a request larger than the token limit does not wait forever."""
+        limiter = self.limiter(rpm=60, tpm=100)
+
+        self.acquire(limiter, [message(4000)])
+        self.acquire(limiter, [message(4000)])
+
+        self.assertEqual(self.clock.sleeps, [60.0])
+
+    def test_no_new_messages_cost_no_tokens(self) -> None:
+        """Test that a request sending nothing past the cache boundary is not charged tokens."""
+        self.assertEqual(RateLimiter.estimate_tokens([]), 0)
+
+    def test_invalid_limits(self) -> None:
+        """Test that limits that could never allow a request are rejected."""
+        for rpm, tpm in [(0, 100), (0.5, 100), (1, 0), (1, -5), (float("nan"), 100)]:
+            with self.assertRaises(ValueError):
+                self.limiter(rpm, tpm)
+
+    def test_disabled_without_environment(self) -> None:
+        """Test that requests are only limited when configured."""
+        with mock.patch.dict("os.environ", clear=True):
+            self.assertIsNone(RateLimiter.from_env())
+        with mock.patch.dict("os.environ", {"AGENTLISP_TPM": "5000"}, clear=True):
+            limiter = RateLimiter.from_env()
+        assert limiter is not None
+        self.assertEqual((limiter.rpm, limiter.tpm), (40, 5000))
+
+    def test_invalid_environment(self) -> None:
+        """Test that malformed limits in the environment are reported."""
+        for value in ["0", "fast"]:
+            with mock.patch.dict("os.environ", {"AGENTLISP_RPM": value}, clear=True):
+                with self.assertRaises(ValueError) as context:
+                    RateLimiter.from_env()
+                self.assertIn("AGENTLISP_RPM", str(context.exception))
+
+
+class TestProgramCache(unittest.TestCase):
+    """Test caching parsed programs across runs."""
+
+    PROGRAM = '(defun main () (write "hello"))'
+
+    def setUp(self) -> None:
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache_dir = Path(temp_dir.name)
+        patcher = mock.patch("agentlisp.PROGRAM_CACHE_DIR", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_program_is_reused(self) -> None:
+        """Test that a program parsed once is loaded from the cache."""
+        program = load_program(self.PROGRAM)
+
+        with mock.patch("agentlisp.parse_program") as parse:
+            cached = load_program(self.PROGRAM)
+
+        parse.assert_not_called()
+        self.assertEqual(cached, program)
+        self.assertEqual(len(list(self.cache_dir.glob("*.pkl"))), 1)
+
+    def test_corrupt_entry_is_replaced(self) -> None:
+        """Test that an unloadable cache entry is treated as a miss and rewritten."""
+        program = load_program(self.PROGRAM)
+        (cache_file,) = self.cache_dir.glob("*.pkl")
+        for corrupt in [b"", b"garbage", cache_file.read_bytes()[:-5], b"\x80\x05\x8c\x01"]:
+            cache_file.write_bytes(corrupt)
+
+            self.assertEqual(load_program(self.PROGRAM), program)
+            self.assertNotEqual(cache_file.read_bytes(), corrupt)
+
+    def test_parser_change_invalidates_cache(self) -> None:
+        """Test that programs cached by another version of the parser are parsed again."""
+        load_program(self.PROGRAM)
+
+        with mock.patch("agentlisp.PARSER_FINGERPRINT", "another version"):
+            load_program(self.PROGRAM)
+
+        self.assertEqual(len(list(self.cache_dir.glob("*.pkl"))), 2)
+
+    def test_cache_can_be_bypassed(self) -> None:
+        """Test that the cache is neither read nor written when disabled."""
+        load_program(self.PROGRAM, use_cache=False)
+
+        self.assertEqual(list(self.cache_dir.iterdir()), [])
+
+
+class TestLLMCache(unittest.TestCase):
+    """Test persisting LLM responses across runs."""
+
+    def test_responses_persist_across_runs(self) -> None:
+        """Test that a response recorded by one run is found by the next."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = str(Path(temp_dir) / "responses")
+            key = LLMCache.make_key("model", [message(10)])
+
+            first_run = LLMCache(path)
+            self.assertIsNone(first_run.get(key))
+            first_run.set(key, "answer")
+            first_run.store.close()
+
+            second_run = LLMCache(path)
+            self.assertEqual(second_run.get(key), "answer")
+            self.assertIsNone(second_run.get(LLMCache.make_key("other", [message(10)])))
+            second_run.store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 """Tests for the small-step evaluator."""
 
 import unittest
+from pathlib import Path
 from typing import Callable
 
 from lisp_ast import (
@@ -10,6 +11,7 @@ from lisp_ast import (
     FunctionCall,
     IfExpr,
     Variable,
+    VariableRef,
     LetBinding,
     LetExpr,
     WriteExpr,
@@ -18,6 +20,7 @@ from lisp_ast import (
     AskExpr,
     FunctionDef,
     Program,
+    Value,
 )
 from eval import (
     State,
@@ -30,11 +33,26 @@ from eval import (
     TellCall,
     AskCall,
     Env,
+    JIT_THRESHOLD,
     create_initial_state,
+    run_until_syscall,
     step,
     step_with_syscall,
 )
-from parser import parse_program
+from jit import MAX_COMPILED_DEPTH, compile_function
+from optimize import optimize_program
+from parser import parse_program, ParseError, Tokenizer
+
+
+# Source of test.alisp, read once at import, found next to this file so tests
+# can run from any directory
+try:
+    _TEST_ALISP_SRC: str | None = Path(__file__).with_name("test.alisp").read_text()
+except FileNotFoundError:
+    _TEST_ALISP_SRC = None
+
+# (let ((x 10)) x), shared by tests that only need a simple binding
+LET_X_10 = LetExpr([LetBinding("x", IntLiteral(10))], Variable("x"))
 
 
 class TestBasicEvaluation(unittest.TestCase):
@@ -63,11 +81,19 @@ class TestBasicEvaluation(unittest.TestCase):
         assert isinstance(next_state, Done)
         self.assertEqual(next_state.value, "hello")
 
+    def test_string_escapes(self) -> None:
+        """Test that escape sequences in parsed strings are replaced left to right."""
+        program = parse_program(r'(defun main () "a\nb\t\"c\\n\\")')
+        state = create_initial_state(program)
+
+        next_state = step(state)
+        self.assertIsInstance(next_state, Done)
+        assert isinstance(next_state, Done)
+        self.assertEqual(next_state.value, 'a\nb\t"c\\n\\')
+
     def test_variable_lookup(self) -> None:
         """Test variable lookup in let expressions."""
-        # (let ((x 10)) x)
-        let_expr = LetExpr([LetBinding("x", IntLiteral(10))], Variable("x"))
-        func = FunctionDef("main", [], let_expr)
+        func = FunctionDef("main", [], LET_X_10)
         program = Program([func])
         state: State | None = create_initial_state(program)
 
@@ -153,9 +179,7 @@ class TestLetExpressions(unittest.TestCase):
 
     def test_single_binding(self) -> None:
         """Test let with a single binding."""
-        # (let ((x 10)) x)
-        let_expr = LetExpr([LetBinding("x", IntLiteral(10))], Variable("x"))
-        func = FunctionDef("main", [], let_expr)
+        func = FunctionDef("main", [], LET_X_10)
         program = Program([func])
         state: State | None = create_initial_state(program)
 
@@ -206,6 +230,24 @@ class TestLetExpressions(unittest.TestCase):
         assert isinstance(state, Done)
         self.assertEqual(state.value, 10)
 
+    def test_let_binding_does_not_escape_scope(self) -> None:
+        """Test that a let's bindings are dropped once its body is evaluated."""
+        # (defun second (a b) b)
+        # (defun main () (second (let ((x 10)) x) x))
+        second_func = FunctionDef("second", ["a", "b"], Variable("b"))
+        first_arg = LetExpr([LetBinding("x", IntLiteral(10))], Variable("x"))
+        main_func = FunctionDef(
+            "main", [], FunctionCall("second", [first_arg, Variable("x")])
+        )
+        program = Program([second_func, main_func])
+        state: State | None = create_initial_state(program)
+
+        with self.assertRaises(RuntimeError) as context:
+            while state is not None and not isinstance(state, Done):
+                state = step(state)
+
+        self.assertIn("Undefined variable: x", str(context.exception))
+
 
 class TestFunctionCalls(unittest.TestCase):
     """Test function call evaluation."""
@@ -263,6 +305,303 @@ class TestFunctionCalls(unittest.TestCase):
         assert isinstance(state, Done)
         self.assertEqual(state.value, 20)
 
+    def test_bindings_restored_after_call(self) -> None:
+        """Test that the caller's bindings are visible again after a call returns."""
+        # (defun second (x y) y)
+        # (defun main () (let ((x 1)) (second (second x 2) x)))
+        second_func = FunctionDef("second", ["x", "y"], Variable("y"))
+        inner_call = FunctionCall("second", [Variable("x"), IntLiteral(2)])
+        let_expr = LetExpr(
+            [LetBinding("x", IntLiteral(1))],
+            FunctionCall("second", [inner_call, Variable("x")]),
+        )
+        main_func = FunctionDef("main", [], let_expr)
+        program = Program([second_func, main_func])
+        state: State | None = create_initial_state(program)
+
+        while state is not None and not isinstance(state, Done):
+            state = step(state)
+
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, 1)
+
+    def test_function_does_not_see_caller_bindings(self) -> None:
+        """Test that variables are lexically scoped to the function defining them."""
+        # (defun foo () x)
+        # (defun main () (let ((x 10)) (foo)))
+        foo_func = FunctionDef("foo", [], Variable("x"))
+        let_expr = LetExpr([LetBinding("x", IntLiteral(10))], FunctionCall("foo", []))
+        main_func = FunctionDef("main", [], let_expr)
+        program = Program([foo_func, main_func])
+        state: State | None = create_initial_state(program)
+
+        with self.assertRaises(RuntimeError) as context:
+            while state is not None and not isinstance(state, Done):
+                state = step(state)
+
+        self.assertIn("Undefined variable: x", str(context.exception))
+
+    def test_tail_calls_do_not_grow_value_stack(self) -> None:
+        """Test that a tail-recursive read loop drops each caller's frame."""
+        program = parse_program(
+            '(defun loop (line) (if line (loop (read)) "done"))'
+            '(defun main () (loop "start"))'
+        )
+        state: State | None = create_initial_state(program)
+        assert isinstance(state, Computing)
+        env = state.env
+        inputs = iter(["line"] * 1000 + [""])
+        max_values = 0
+
+        while state is not None and not isinstance(state, Done):
+            if isinstance(state, Interop):
+                state = step_with_syscall(state, lambda sc: next(inputs))
+            else:
+                state = step(state)
+            max_values = max(max_values, len(env.values))
+
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, "done")
+        self.assertLessEqual(max_values, 2)
+
+
+class TestHotFunctions(unittest.TestCase):
+    """Test compilation of frequently called functions."""
+
+    def run_nested_calls(self, func: FunctionDef, depth: int) -> tuple[Env, State | None]:
+        """Run main calling func nested depth times around 42."""
+        call: Expr = IntLiteral(42)
+        for _ in range(depth):
+            call = FunctionCall(func.name, [call])
+        program = Program([func, FunctionDef("main", [], call)])
+        state: State | None = create_initial_state(program)
+        assert isinstance(state, Computing)
+        env = state.env
+
+        while state is not None and not isinstance(state, Done):
+            if isinstance(state, Interop):
+                state = step_with_syscall(state, lambda sc: "")
+            else:
+                state = step(state)
+        return env, state
+
+    def test_hot_function_is_compiled(self) -> None:
+        """Test that a pure function is compiled once it gets hot."""
+        # (defun identity (x) (let ((y x)) (if y y 0)))
+        body = LetExpr(
+            [LetBinding("y", Variable("x"))],
+            IfExpr(Variable("y"), Variable("y"), IntLiteral(0)),
+        )
+        identity_func = FunctionDef("identity", ["x"], body)
+        env, state = self.run_nested_calls(identity_func, JIT_THRESHOLD * 2)
+
+        self.assertIsNotNone(env.compiled.get("identity"))
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, 42)
+
+    def test_callees_are_compiled_once(self) -> None:
+        """Test that a callee compiled along with a hot function is reused when it gets hot."""
+        # (defun inc (x) (let ((y x)) y))
+        # (defun twice (x) (inc (inc x)))
+        inc_body = LetExpr([LetBinding("y", Variable("x"))], Variable("y"))
+        inc_func = FunctionDef("inc", ["x"], inc_body)
+        twice_func = FunctionDef(
+            "twice", ["x"], FunctionCall("inc", [FunctionCall("inc", [Variable("x")])])
+        )
+        env = Env([], {"inc": inc_func, "twice": twice_func})
+
+        compiled_twice = compile_function(twice_func, env.functions, env.definitions)
+        compiled_inc = env.definitions["inc"].run
+
+        self.assertIsNotNone(compiled_twice)
+        self.assertIs(compile_function(inc_func, env.functions, env.definitions), compiled_inc)
+        self.assertIs(env.fork().definitions, env.definitions)
+
+    def test_compiled_call_chains_are_bounded(self) -> None:
+        """Test that compiling callers of compiled functions stops before the stack overflows."""
+        # (defun h<i> (x) (h<i+1> x)), with the last one returning x
+        count = MAX_COMPILED_DEPTH + 100
+        funcs = [
+            FunctionDef(f"h{i}", ["x"], FunctionCall(f"h{i + 1}", [Variable("x")]))
+            for i in range(count - 1)
+        ]
+        funcs.append(FunctionDef(f"h{count - 1}", ["x"], Variable("x")))
+        env = Env([], {func.name: func for func in funcs})
+
+        # Functions get hot from the deepest one up, each reusing its compiled callee
+        results = [
+            compile_function(func, env.functions, env.definitions) for func in reversed(funcs)
+        ]
+
+        self.assertEqual(sum(result is not None for result in results), MAX_COMPILED_DEPTH)
+        for result in results:
+            if result is not None:
+                self.assertEqual(result([7]), 7)
+
+    def test_function_with_syscalls_is_not_compiled(self) -> None:
+        """Test that functions performing system calls stay interpreted."""
+        # (defun echo (x) (let ((_ (write x))) x))
+        body = LetExpr([LetBinding("_", WriteExpr(Variable("x")))], Variable("x"))
+        echo_func = FunctionDef("echo", ["x"], body)
+        env, state = self.run_nested_calls(echo_func, JIT_THRESHOLD * 2)
+
+        self.assertIn("echo", env.compiled)
+        self.assertIsNone(env.compiled["echo"])
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, 42)
+
+
+class TestOptimizer(unittest.TestCase):
+    """Test the optimization pass run before evaluation."""
+
+    def test_literal_bindings_are_propagated(self) -> None:
+        """Test that let bindings of literals and variables are substituted away."""
+        # (let ((x 10) (y x)) y)
+        let_expr = LetExpr(
+            [LetBinding("x", IntLiteral(10)), LetBinding("y", Variable("x"))],
+            Variable("y"),
+        )
+        program = optimize_program(Program([FunctionDef("main", [], let_expr)]))
+
+        main_func = program.get_main()
+        assert main_func is not None
+        self.assertEqual(main_func.body, IntLiteral(10))
+
+    def test_nested_lets_are_merged(self) -> None:
+        """Test that a let making up another let's body is merged into it."""
+        # (let ((x (read))) (let ((y (read))) x))
+        inner_let = LetExpr([LetBinding("y", ReadExpr())], Variable("x"))
+        outer_let = LetExpr([LetBinding("x", ReadExpr())], inner_let)
+        program = optimize_program(Program([FunctionDef("main", [], outer_let)]))
+
+        main_func = program.get_main()
+        assert main_func is not None
+        self.assertEqual(
+            main_func.body,
+            LetExpr(
+                (LetBinding("x", ReadExpr()), LetBinding("y", ReadExpr())),
+                VariableRef(0, "x"),
+            ),
+        )
+
+    def test_single_use_function_is_inlined(self) -> None:
+        """Test that a function called from one place is inlined."""
+        # (defun identity (x) x)
+        # (defun main () (identity 42))
+        identity_func = FunctionDef("identity", ["x"], Variable("x"))
+        main_func = FunctionDef("main", [], FunctionCall("identity", [IntLiteral(42)]))
+        program = optimize_program(Program([identity_func, main_func]))
+
+        optimized_main = program.get_main()
+        assert optimized_main is not None
+        self.assertEqual(optimized_main.body, IntLiteral(42))
+
+    def test_recursive_function_is_not_inlined(self) -> None:
+        """Test that recursive functions keep their calls."""
+        # (defun loop (x) (if x (loop "") x))
+        # (defun main () (loop "go"))
+        body = IfExpr(Variable("x"), FunctionCall("loop", [StringLiteral("")]), Variable("x"))
+        loop_func = FunctionDef("loop", ["x"], body)
+        main_func = FunctionDef("main", [], FunctionCall("loop", [StringLiteral("go")]))
+        program = optimize_program(Program([loop_func, main_func]))
+
+        optimized_main = program.get_main()
+        assert optimized_main is not None
+        self.assertIsInstance(optimized_main.body, FunctionCall)
+
+    def test_program_is_optimized_once(self) -> None:
+        """Test that optimizing a program again reuses the first result."""
+        program = Program([FunctionDef("main", [], LET_X_10)])
+        optimized = optimize_program(program)
+
+        self.assertIs(optimize_program(program), optimized)
+        self.assertIs(optimize_program(optimized), optimized)
+
+    def test_long_chain_of_single_use_functions(self) -> None:
+        """Test that a long chain of functions each called once is optimized and runs."""
+        # (defun g0 (x) (g1 x)) ... (defun g2000 (x) x) (defun main () (g0 7))
+        count = 2000
+        functions = [
+            FunctionDef(f"g{i}", ["x"], FunctionCall(f"g{i + 1}", [Variable("x")]))
+            for i in range(count)
+        ]
+        functions.append(FunctionDef(f"g{count}", ["x"], Variable("x")))
+        functions.append(FunctionDef("main", [], FunctionCall("g0", [IntLiteral(7)])))
+        state, _ = run_until_syscall(create_initial_state(Program(functions)))
+
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, 7)
+
+    def test_many_bindings_in_one_let(self) -> None:
+        """Test that a let mixing many trivial and other bindings keeps its other bindings."""
+        # (let ((x0 1) (y0 (id x0)) (x1 y0) (y1 (id x1)) ... ) x<count>)
+        count = 2000
+        bindings = [LetBinding("x0", IntLiteral(1))]
+        for i in range(count):
+            bindings.append(LetBinding(f"y{i}", FunctionCall("id", [Variable(f"x{i}")])))
+            bindings.append(LetBinding(f"x{i + 1}", Variable(f"y{i}")))
+        main_func = FunctionDef("main", [], LetExpr(bindings, Variable(f"x{count}")))
+        program = Program([FunctionDef("id", ["x"], Variable("x")), main_func])
+
+        body = optimize_program(program).functions_by_name["main"].body
+        state, _ = run_until_syscall(create_initial_state(program))
+
+        assert isinstance(body, LetExpr)
+        self.assertEqual(len(body.bindings), count)
+        self.assertEqual(body.body, VariableRef(count - 1, f"y{count - 1}"))
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, 1)
+
+    def test_deeply_nested_body_is_evaluated_unoptimized(self) -> None:
+        """Test that bodies too deep for the optimizer to walk still evaluate."""
+        # (if 1 (if 1 ... 5 0) 0) nested 600 deep
+        body: Expr = IntLiteral(5)
+        for _ in range(600):
+            body = IfExpr(IntLiteral(1), body, IntLiteral(0))
+        program = Program([FunctionDef("main", [], body)])
+
+        self.assertIs(optimize_program(program), program)
+        state, _ = run_until_syscall(create_initial_state(program))
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, 5)
+
+    def test_inlined_function_sees_its_arguments(self) -> None:
+        """Test that inlining keeps references pointing at the right values."""
+        # (defun second (a b) (let ((_ (write a))) b))
+        # (defun main () (let ((x (read)) (y (read))) (second y x)))
+        second_body = LetExpr([LetBinding("_", WriteExpr(Variable("a")))], Variable("b"))
+        second_func = FunctionDef("second", ["a", "b"], second_body)
+        main_body = LetExpr(
+            [LetBinding("x", ReadExpr()), LetBinding("y", ReadExpr())],
+            FunctionCall("second", [Variable("y"), Variable("x")]),
+        )
+        program = Program([second_func, FunctionDef("main", [], main_body)])
+        state: State | None = create_initial_state(program)
+
+        inputs = ["first", "second"]
+        write_outputs: list[str] = []
+
+        def handler(sc: SysCall) -> str:
+            if isinstance(sc, WriteCall):
+                write_outputs.append(sc.text)
+                return ""
+            return inputs.pop(0)
+
+        while state is not None and not isinstance(state, Done):
+            state = step_with_syscall(state, handler)
+
+        self.assertIsInstance(state, Done)
+        assert isinstance(state, Done)
+        self.assertEqual(state.value, "first")
+        self.assertEqual(write_outputs, ["second"])
+
 
 class TestSystemCalls(unittest.TestCase):
     """Test system call primitives."""
@@ -404,14 +743,18 @@ class TestSystemCalls(unittest.TestCase):
 class TestTestAlisp(unittest.TestCase):
     """Test that test.alisp executes correctly."""
 
+    program: Program
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Parse test.alisp once for all tests in the class."""
+        if _TEST_ALISP_SRC is None:
+            raise unittest.SkipTest("test.alisp not found")
+        cls.program = parse_program(_TEST_ALISP_SRC)
+
     def test_test_alisp_execution(self) -> None:
         """Test that test.alisp produces the expected output."""
-        # Parse test.alisp
-        with open("test.alisp", "r") as f:
-            program_text = f.read()
-
-        program = parse_program(program_text)
-        state: State | None = create_initial_state(program)
+        state: State | None = create_initial_state(self.program)
 
         # Track write calls
         write_outputs: list[str] = []
@@ -443,9 +786,7 @@ class TestStepByStepEvaluation(unittest.TestCase):
 
     def test_evaluation_steps_are_deterministic(self) -> None:
         """Test that stepping through evaluation is deterministic."""
-        # (let ((x 10)) x)
-        let_expr = LetExpr([LetBinding("x", IntLiteral(10))], Variable("x"))
-        func = FunctionDef("main", [], let_expr)
+        func = FunctionDef("main", [], LET_X_10)
         program = Program([func])
 
         # Run twice and compare
@@ -464,6 +805,68 @@ class TestStepByStepEvaluation(unittest.TestCase):
             # States should be equal (same type and values)
             self.assertEqual(type(state1), type(state2))
 
+    def test_forked_states_step_independently(self) -> None:
+        """Test that a forked state is unaffected by stepping the original."""
+        # (let ((x (read))) x)
+        let_expr = LetExpr([LetBinding("x", ReadExpr())], Variable("x"))
+        program = Program([FunctionDef("main", [], let_expr)])
+        state: State | None = create_initial_state(program)
+        while isinstance(state, Computing):
+            state = step(state)
+        assert isinstance(state, Interop)
+        assert isinstance(state.continuation, Computing)
+
+        forked: State = Interop(state.syscall, state.continuation.fork())
+        results: list[Value] = []
+        for interop, answer in [(state, "first"), (forked, "second")]:
+            current = step_with_syscall(interop, lambda sc: answer)
+            while current is not None and not isinstance(current, Done):
+                current = step(current)
+            assert isinstance(current, Done)
+            results.append(current.value)
+
+        self.assertEqual(results, ["first", "second"])
+
+    def test_run_until_syscall_stops_at_interop(self) -> None:
+        """Test that running stops when a system call needs handling."""
+        # (write (if 1 "yes" "no"))
+        write_expr = WriteExpr(IfExpr(IntLiteral(1), StringLiteral("yes"), StringLiteral("no")))
+        program = Program([FunctionDef("main", [], write_expr)])
+
+        state, steps = run_until_syscall(create_initial_state(program))
+
+        self.assertIsInstance(state, Interop)
+        assert isinstance(state, Interop)
+        self.assertEqual(state.syscall, WriteCall("yes"))
+        self.assertEqual(steps, 4)
+
+    def test_run_until_syscall_respects_step_limit(self) -> None:
+        """Test that running stops after the maximum number of steps."""
+        # (write (if 1 "yes" "no"))
+        write_expr = WriteExpr(IfExpr(IntLiteral(1), StringLiteral("yes"), StringLiteral("no")))
+        program = Program([FunctionDef("main", [], write_expr)])
+
+        state, steps = run_until_syscall(create_initial_state(program), max_steps=2)
+
+        self.assertIsInstance(state, Computing)
+        self.assertEqual(steps, 2)
+
+    def test_run_until_syscall_with_handler_runs_to_completion(self) -> None:
+        """Test that running with a handler continues through system calls."""
+        # (write (read))
+        program = Program([FunctionDef("main", [], WriteExpr(ReadExpr()))])
+        written: list[str] = []
+
+        def handler(sc: SysCall) -> str:
+            if isinstance(sc, WriteCall):
+                written.append(sc.text)
+            return "input"
+
+        state, _ = run_until_syscall(create_initial_state(program), handler)
+
+        self.assertIsInstance(state, Done)
+        self.assertEqual(written, ["input"])
+
     def test_done_state_returns_none_on_step(self) -> None:
         """Test that stepping a Done state returns None."""
         done_state: State = Done(42)
@@ -478,6 +881,73 @@ class TestStepByStepEvaluation(unittest.TestCase):
         self.assertIsNone(next_state)
 
 
+class TestParser(unittest.TestCase):
+    """Test tokenizing and parsing program text."""
+
+    def test_tokenize_nested_lists(self) -> None:
+        """Test that lists nest and strings keep their quotes and escapes."""
+        sexps = Tokenizer('(a (b "x \\"y\\" z") c) d').tokenize_all()
+
+        self.assertEqual(sexps, [["a", ["b", '"x \\"y\\" z"'], "c"], "d"])
+
+    def test_whitespace_variants(self) -> None:
+        """Test that carriage returns separate atoms and trailing whitespace is ignored."""
+        sexps = Tokenizer("(a\rb\r\nc\td)  \n\t\r ").tokenize_all()
+
+        self.assertEqual(sexps, [["a", "b", "c", "d"]])
+
+    def test_form_feed_is_part_of_an_atom(self) -> None:
+        """Test that only spaces, tabs and line breaks separate atoms."""
+        sexps = Tokenizer("(a\fb)").tokenize_all()
+
+        self.assertEqual(sexps, [["a\fb"]])
+
+    def test_atom_containing_quote(self) -> None:
+        """Test that a quote inside an atom does not start a string."""
+        sexps = Tokenizer('(a"b c)').tokenize_all()
+
+        self.assertEqual(sexps, [['a"b', "c"]])
+
+    def test_numbers_and_identifiers(self) -> None:
+        """Test that atoms are integers exactly when int() accepts them."""
+        cases: list[tuple[str, Expr]] = [
+            ("42", IntLiteral(42)),
+            ("-7", IntLiteral(-7)),
+            ("+5", IntLiteral(5)),
+            ("1_000", IntLiteral(1000)),
+            ("\f5", IntLiteral(5)),
+            ("-", Variable("-")),
+            ("+", Variable("+")),
+            ("-x", Variable("-x")),
+            ("1x", Variable("1x")),
+            ("x1", Variable("x1")),
+        ]
+        for atom, expected in cases:
+            program = parse_program(f"(defun main () {atom})")
+            self.assertEqual(program.functions[0].body, expected, atom)
+
+    def test_unterminated_string(self) -> None:
+        """Test that strings missing their closing quote are rejected."""
+        for text in ['"abc', '"abc\\"', '(write "abc)']:
+            with self.assertRaises(ParseError) as context:
+                Tokenizer(text).tokenize_all()
+            self.assertIn("Unterminated string", str(context.exception))
+
+    def test_stray_closing_parenthesis(self) -> None:
+        """Test that a closing parenthesis without an open list is rejected."""
+        with self.assertRaises(ParseError) as context:
+            Tokenizer("(a b))").tokenize_all()
+
+        self.assertIn("Unexpected closing parenthesis", str(context.exception))
+
+    def test_unterminated_list(self) -> None:
+        """Test that lists missing their closing parenthesis are rejected."""
+        with self.assertRaises(ParseError) as context:
+            Tokenizer("(a (b c)").tokenize_all()
+
+        self.assertIn("Unterminated list", str(context.exception))
+
+
 class TestErrorConditions(unittest.TestCase):
     """Test error handling in the evaluator."""
 
@@ -523,6 +993,16 @@ class TestErrorConditions(unittest.TestCase):
 
         self.assertIn("expects", str(context.exception))
 
+    def test_too_deeply_nested_program(self) -> None:
+        """Test that nesting too deep to parse is reported as a parse error."""
+        depth = 5000
+        text = "(defun main () " + "(if 1 " * depth + "5" + " 0)" * depth + ")"
+
+        with self.assertRaises(ParseError) as context:
+            parse_program(text)
+
+        self.assertIn("nested too deeply", str(context.exception))
+
 
 if __name__ == "__main__":
     unittest.main()